@@ -1,19 +1,68 @@
-from flask import Flask, render_template, redirect, url_for, session, request, flash
+from flask import Flask, render_template, redirect, url_for, session, request, flash, make_response, jsonify, send_from_directory, g
 from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
-from utils.db import get_db_connection
+from datetime import datetime, timezone
+from utils.db import get_db_connection, DB_PATH
+from utils.geo import geocode, bounding_box, parse_bbox, register_geo_functions, search_rings, NEAR_LIMIT
+from utils.trigram import index_book, fuzzy_match_query, MAX_MATCHES
+from utils.notifications import render_notification, start_compaction_thread, RETENTION_DAYS
+from utils.images import save_cover, start_gc_thread
+from utils.analytics import dashboard_stats
+from utils.maintenance import start_maintenance_thread, SCHEDULED_STEPS
+from utils.suggest import SuggestIndex, SUGGEST_KINDS
+from utils.saved_searches import index_saved_search, matching_searches, notify_matches
+from utils.receipts import ReceiptRenderer, write_receipt, receipt_path, RECEIPT_DIR
+from utils.profiler import SamplingProfiler, save_capture, load_captures, PROFILE_DIR, PROFILE_KEEP
 import sqlite3
 import random
 import string
+import os
 
 app = Flask(__name__)
-app.secret_key = "leafora_secret_key"  # change in production
+# Production (serve.py) requires LEAFORA_SECRET_KEY; the fallback is for the
+# development server only
+app.secret_key = os.environ.get("LEAFORA_SECRET_KEY", "leafora_dev_secret_key")
+
+
+def start_background_jobs():
+    """Start the optional periodic jobs; returns their threads.
+
+    Call once per deployment, not per worker process: serve.py runs them in
+    a single dedicated process, the development server in its reloader child.
+    """
+    threads = []
+    # Collection of orphaned cover images (seconds between runs)
+    if os.environ.get("LEAFORA_IMAGE_GC_INTERVAL"):
+        threads.append(start_gc_thread(get_db_connection, int(os.environ["LEAFORA_IMAGE_GC_INTERVAL"])))
+
+    # Scheduled database maintenance (seconds between runs); backups are
+    # included when LEAFORA_BACKUP_DIR is set. This is also where pages freed
+    # by deletes are vacuumed, so delete requests never wait on it.
+    if os.environ.get("LEAFORA_MAINTENANCE_INTERVAL"):
+        threads.append(start_maintenance_thread(
+            get_db_connection,
+            DB_PATH,
+            int(os.environ["LEAFORA_MAINTENANCE_INTERVAL"]),
+            steps=SCHEDULED_STEPS + (("backup",) if os.environ.get("LEAFORA_BACKUP_DIR") else ()),
+            backup_dir=os.environ.get("LEAFORA_BACKUP_DIR", "backups")
+        ))
+
+    # Deletion of old completed notifications (seconds between runs)
+    if os.environ.get("LEAFORA_NOTIFICATION_COMPACTION_INTERVAL"):
+        threads.append(start_compaction_thread(
+            get_db_connection,
+            int(os.environ["LEAFORA_NOTIFICATION_COMPACTION_INTERVAL"]),
+            retention_days=int(os.environ.get("LEAFORA_NOTIFICATION_RETENTION_DAYS", RETENTION_DAYS))
+        ))
+    return threads
+
 
 # =============================
 # CONTENT STRUCTURE
 # =============================
 # 1. AUTHENTICATION & DECORATORS
+# 1b. HTTP CACHING (ETAG / LAST-MODIFIED)
+# 1c. REQUEST PROFILING
 # 2. HOME & BOOK LISTING
 # 3. BOOK DETAILS & REVIEWS
 # 4. USER AUTHENTICATION (SIGNUP/LOGIN/LOGOUT)
@@ -39,6 +88,128 @@ def login_required(f):
     return decorated_function
 
 
+# =============================
+# 1b. HTTP CACHING (ETAG / LAST-MODIFIED)
+# =============================
+# Purpose: Answer unchanged book/catalog pages with 304 and let a reverse
+# proxy cache anonymous catalog traffic
+
+PUBLIC_MAX_AGE = 60  # seconds a shared cache may reuse an anonymous page
+
+
+def page_etag(*parts):
+    """Build an ETag for a page from its data version and the viewer.
+
+    Returns None when the page must not be cached (flash messages pending).
+    """
+    if "_flashes" in session:
+        return None
+    viewer = f"{session['user_id']}:{session.get('role')}" if "user_id" in session else "anon"
+    return "-".join(str(part) for part in (*parts, viewer))
+
+
+def not_modified(etag, last_modified=None):
+    """Return a 304 response if the request's validators still match, else None."""
+    if etag is None:
+        return None
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    else:
+        fresh = bool(last_modified and request.if_modified_since and last_modified <= request.if_modified_since)
+    if not fresh:
+        return None
+    return with_cache_headers(app.response_class(status=304), etag, last_modified)
+
+
+def with_cache_headers(response, etag, last_modified=None):
+    """Attach validators and Cache-Control/Vary policy to a page response."""
+    response.vary.add("Cookie")
+    if etag is None:
+        response.cache_control.no_store = True
+        return response
+
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    if "user_id" in session:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = PUBLIC_MAX_AGE
+    return response
+
+
+def catalog_version(cursor):
+    """Current catalog version, bumped by triggers on every books write."""
+    cursor.execute("SELECT version FROM cache_versions WHERE name = 'catalog'")
+    row = cursor.fetchone()
+    return row["version"] if row else 0
+
+
+# =============================
+# 1c. REQUEST PROFILING
+# =============================
+# Purpose: Sample where a request spends its Python time. Admins opt in per
+# request with the X-Leafora-Profile: 1 header or ?_profile=1; a random
+# fraction of all traffic is sampled when LEAFORA_PROFILE_SAMPLE_RATE is set
+# (e.g. 0.01). Captures are listed at /admin/profiles.
+
+PROFILE_HEADER = "X-Leafora-Profile"
+PROFILE_SAMPLE_RATE = float(os.environ.get("LEAFORA_PROFILE_SAMPLE_RATE", 0))
+
+
+def profile_trigger():
+    """Why this request should be profiled ("admin" or "sampled"), or None."""
+    # The session is only read when a flag is present, so ordinary responses
+    # do not pick up Vary: Cookie
+    if request.headers.get(PROFILE_HEADER) == "1" or request.args.get("_profile") == "1":
+        if session.get("role") in ["admin", "super_admin"]:
+            return "admin"
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def finish_profile(status_code):
+    """Stop the request's profiler, if any, and store the capture."""
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return None
+    profiler.stop()
+    return save_capture(profiler, {
+        "method": request.method,
+        "path": request.full_path.rstrip("?"),
+        "endpoint": request.endpoint,
+        "status": status_code,
+        "trigger": g.pop("profile_trigger", None),
+    })
+
+
+@app.before_request
+def start_profiler():
+    trigger = profile_trigger()
+    if trigger:
+        g.profile_trigger = trigger
+        g.profiler = SamplingProfiler().start()
+
+
+@app.after_request
+def stop_profiler(response):
+    trigger = g.get("profile_trigger")
+    capture_id = finish_profile(response.status_code)
+    if capture_id and trigger == "admin":
+        response.headers[PROFILE_HEADER] = capture_id
+    return response
+
+
+@app.teardown_request
+def stop_profiler_on_error(error):
+    # after_request is skipped when a view raises
+    if error is not None:
+        finish_profile(500)
+
+
 # =============================
 # 2. HOME & BOOK LISTING
 # =============================
@@ -53,6 +224,7 @@ def home():
     cursor.execute("""
         SELECT id, title, buy_price, image
         FROM books
+        WHERE availability = 'available'
         ORDER BY created_at DESC
         LIMIT 8
     """)
@@ -62,85 +234,208 @@ def home():
     return render_template("index.html", new_books=new_books)
 
 
+RADIUS_CHOICES_KM = [5, 10, 25, 50, 100]
+
+
+def search_books(cursor):
+    """Apply the catalog filters from the query string and return (books, filters).
+
+    Only available listings are returned. Title and author are matched
+    through the trigram index, so typos still find results; without a location
+    they are ranked by similarity, and at most MAX_MATCHES are returned (after
+    every other filter).
+
+    Location filters go through the books_geo R*Tree: an explicit `bbox`
+    ("min_lon,min_lat,max_lon,max_lat"), or a centre point (`near` or
+    `lat`/`lon`) with an optional `radius_km`. A centre returns the NEAR_LIMIT
+    nearest listings with a known location, searched ring by ring (see
+    utils/geo.py).
+    """
+    filters = {
+        "name": request.args.get("name", ""),
+        "author": request.args.get("author", ""),
+        "category": request.args.get("category", ""),
+        "max_price": int(request.args.get("max_price", 1500)),
+        "near": request.args.get("near", "").strip(),
+        "radius_km": request.args.get("radius_km", type=float),
+        "bbox": request.args.get("bbox", ""),
+        "near_unknown": False,
+    }
+
+    center = None
+    lat = request.args.get("lat", type=float)
+    lon = request.args.get("lon", type=float)
+    if filters["near"]:
+        center = geocode(filters["near"])
+        filters["near_unknown"] = center is None
+    elif lat is not None and lon is not None:
+        center = (lat, lon)
+
+    box = None
+    if not center and filters["bbox"]:
+        box = parse_bbox(filters["bbox"])
+
+    # Parameters are collected per clause so they stay in textual order
+    select_params, join_params, where_params = [], [], []
+    columns = "b.*"
+    if center:
+        register_geo_functions(cursor.connection)
+        columns += ", haversine_km(?, ?, b.lat, b.lon) AS distance_km"
+        select_params.extend(center)
+    else:
+        columns += ", NULL AS distance_km"
+
+    if center or box:
+        # Only candidates inside the bounding box (or ring) are read from books
+        source = """
+            FROM books_geo g
+            JOIN books b ON b.id = g.id
+        """
+        conditions = ["g.min_lat >= ? AND g.max_lat <= ? AND g.min_lon >= ? AND g.max_lon <= ?"]
+    else:
+        source = " FROM books b"
+        conditions = []
+    if box:
+        where_params.extend(box)
+
+    # Sold/reserved/rented listings never reach the catalog; this predicate
+    # matches the partial indexes on available books
+    conditions.append("b.availability = 'available'")
+
+    # Fuzzy title/author matches are joined in, so the MAX_MATCHES cap below
+    # only applies once every other filter has been checked
+    fuzzy = [(field, text) for field, text in (("title", filters["name"]), ("author", filters["author"])) if text]
+    for field, text in fuzzy:
+        sql, match_params = fuzzy_match_query(cursor, field, text)
+        source += f" JOIN ({sql}) m_{field} ON m_{field}.book_id = b.id"
+        join_params.extend(match_params)
+    if fuzzy:
+        columns += ", " + " + ".join(f"m_{field}.score" for field, _ in fuzzy) + " AS match_score"
+
+    if filters["category"]:
+        conditions.append("b.category = ?")
+        where_params.append(filters["category"])
+    if filters["max_price"]:
+        conditions.append("b.buy_price <= ?")
+        where_params.append(filters["max_price"])
+
+    if center:
+        # Every listing within the ring's radius lies inside its box, so once a
+        # ring holds NEAR_LIMIT of them they are the nearest ones overall
+        conditions.append("distance_km <= ?")
+        query = f"SELECT {columns} {source} WHERE {' AND '.join(conditions)} ORDER BY distance_km LIMIT ?"
+        for radius in search_rings(filters["radius_km"]):
+            ring = bounding_box(center[0], center[1], radius)
+            cursor.execute(query, select_params + join_params + list(ring) + where_params + [radius, NEAR_LIMIT])
+            books = cursor.fetchall()
+            if len(books) >= NEAR_LIMIT:
+                break
+        return books, filters
+
+    query = f"SELECT {columns} {source} WHERE {' AND '.join(conditions)}"
+    if fuzzy:
+        query += " ORDER BY match_score DESC LIMIT ?"
+        where_params.append(MAX_MATCHES)
+
+    cursor.execute(query, select_params + join_params + where_params)
+    books = cursor.fetchall()
+    return books, filters
+
+
 @app.route("/books")
 def books():
-    """Display all books with filters (name, author, category, price)."""
-    name = request.args.get("name", "")
-    author = request.args.get("author", "")
-    category = request.args.get("category", "")
-    max_price = int(request.args.get("max_price", 1500))
-
+    """Display all books with filters (name, author, category, price, location)."""
     conn = get_db_connection()
     conn.execute("PRAGMA journal_mode=WAL;")
     cursor = conn.cursor()
 
-    cursor.execute("SELECT DISTINCT category FROM books")
+    etag = page_etag("books", catalog_version(cursor))
+    cached = not_modified(etag)
+    if cached:
+        conn.close()
+        return cached
+
+    cursor.execute("SELECT DISTINCT category FROM books WHERE availability = 'available'")
     categories = [row["category"] for row in cursor.fetchall()]
 
-    query = "SELECT * FROM books WHERE 1=1"
-    params = []
-
-    if name:
-        query += " AND title LIKE ?"
-        params.append(f"%{name}%")
-    if author:
-        query += " AND author LIKE ?"
-        params.append(f"%{author}%")
-    if category:
-        query += " AND category = ?"
-        params.append(category)
-    if max_price:
-        query += " AND buy_price <= ?"
-        params.append(max_price)
-
-    cursor.execute(query, params)
-    books = cursor.fetchall()
+    books, filters = search_books(cursor)
     conn.close()
 
-    return render_template(
+    response = make_response(render_template(
         "books.html",
         books=books,
         categories=categories,
-        name=name,
-        author=author,
-        category=category,
-        max_price=max_price
-    )
+        radius_choices=RADIUS_CHOICES_KM,
+        **filters
+    ))
+    return with_cache_headers(response, etag)
 
 
 @app.route("/books_ajax")
 def books_ajax():
     """AJAX endpoint for dynamic book filtering without page reload."""
-    name = request.args.get("name", "")
-    author = request.args.get("author", "")
-    category = request.args.get("category", "")
-    max_price = int(request.args.get("max_price", 1500))
-
     conn = get_db_connection()
     conn.execute("PRAGMA journal_mode=WAL;")
     cursor = conn.cursor()
 
-    query = "SELECT * FROM books WHERE 1=1"
-    params = []
-
-    if name:
-        query += " AND title LIKE ?"
-        params.append(f"%{name}%")
-    if author:
-        query += " AND author LIKE ?"
-        params.append(f"%{author}%")
-    if category:
-        query += " AND category = ?"
-        params.append(category)
-    if max_price:
-        query += " AND buy_price <= ?"
-        params.append(max_price)
-
-    cursor.execute(query, params)
-    books = cursor.fetchall()
+    etag = page_etag("books_ajax", catalog_version(cursor))
+    cached = not_modified(etag)
+    if cached:
+        conn.close()
+        return cached
+
+    books, filters = search_books(cursor)
     conn.close()
 
-    return render_template("books_grid.html", books=books)
+    response = make_response(render_template("books_grid.html", books=books, near_unknown=filters["near_unknown"]))
+    return with_cache_headers(response, etag)
+
+
+# In-memory prefix index for /suggest over available books, updated by the
+# book management and order routes
+suggest_index = SuggestIndex()
+
+
+def sync_suggest_index(cursor, removed=(), added=(), bumps=1):
+    """Apply a committed write that changed `bumps` books rows to suggest_index.
+
+    `removed` and `added` are the listings (title, author, category,
+    availability) as they were before and are after the write; only available
+    ones are in the index.
+    """
+    for book in removed:
+        if book["availability"] == "available":
+            suggest_index.remove_book(book["title"], book["author"], book["category"])
+    for book in added:
+        if book["availability"] == "available":
+            suggest_index.add_book(book["title"], book["author"], book["category"])
+    suggest_index.mark_version(catalog_version(cursor), bumps)
+
+
+@app.route("/suggest")
+def suggest():
+    """Autocomplete: top title, author and category completions for a prefix (JSON)."""
+    prefix = request.args.get("q", "").strip()
+    kinds = [kind for kind in request.args.getlist("kind") if kind in SUGGEST_KINDS] or SUGGEST_KINDS
+    if not prefix:
+        return jsonify({kind: [] for kind in kinds})
+
+    if suggest_index.version is None:
+        # First lookup in this process (serve.py warm-up does it before traffic)
+        conn = get_db_connection()
+        try:
+            suggest_index.refresh(conn.cursor(), catalog_version(conn.cursor()))
+        finally:
+            conn.close()
+    elif suggest_index.needs_check():
+        # Catch up with other workers' writes without delaying this keystroke
+        db_path = os.path.abspath(DB_PATH)
+        suggest_index.refresh_in_background(lambda: get_db_connection(db_path), catalog_version)
+
+    response = jsonify(suggest_index.suggest(prefix, kinds))
+    response.cache_control.public = True
+    response.cache_control.max_age = PUBLIC_MAX_AGE
+    return response
 
 
 @app.route("/contact")
@@ -167,6 +462,14 @@ def book(book_id):
         conn.close()
         return redirect(url_for("books"))
 
+    # updated_at is bumped by edit_book and new reviews, so it validates the whole page
+    last_modified = datetime.strptime(book["updated_at"], "%Y-%m-%d %H:%M:%S").astimezone(timezone.utc)
+    etag = page_etag("book", book_id, book["updated_at"].replace(" ", "T"))
+    cached = not_modified(etag, last_modified)
+    if cached:
+        conn.close()
+        return cached
+
     cursor.execute("""
         SELECT r.rating, r.comment, u.full_name
         FROM reviews r
@@ -176,7 +479,8 @@ def book(book_id):
     """, (book_id,))
     reviews = cursor.fetchall()
     conn.close()
-    return render_template("book.html", book=book, reviews=reviews)
+    response = make_response(render_template("book.html", book=book, reviews=reviews))
+    return with_cache_headers(response, etag, last_modified)
 
 
 @app.route("/book/<int:book_id>/review", methods=["POST"])
@@ -207,6 +511,9 @@ def add_review(book_id):
             INSERT INTO reviews (book_id, user_id, rating, comment)
             VALUES (?, ?, ?, ?)
         """, (book_id, session["user_id"], rating, comment))
+        cursor.execute("""
+            UPDATE books SET updated_at=? WHERE id=?
+        """, (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), book_id))
         conn.commit()
         flash("Review submitted successfully.", "success")
     except sqlite3.IntegrityError as e:
@@ -310,6 +617,16 @@ def logout():
 # =============================
 # Purpose: Create, accept, and reject book orders (buy/rent)
 
+def render_receipt_document(order):
+    """Render the standalone receipt document (outside of any request)."""
+    with app.test_request_context():
+        return render_template("receipt_print.html", order=order)
+
+
+# Receipts (with their QR code) are rendered once per order status on a
+# background thread after the order is committed; see utils/receipts.py
+receipt_renderer = ReceiptRenderer(get_db_connection, render_receipt_document)
+
 # http://127.0.0.1:5000/order/4/buy
 @app.route("/order/<int:book_id>/<string:order_type>", methods=["POST"])
 @login_required
@@ -329,20 +646,28 @@ def create_order(book_id, order_type):
         rent_months = int(request.form.get("rent_months", 1)) if order_type == "rent" else None
         total_price = book["buy_price"] if order_type == "buy" else book["rent_price"] * rent_months
 
+        # Reserve the copy in one conditional statement: only one buyer can win
+        cursor.execute("""
+            UPDATE books SET availability='reserved', updated_at=?
+            WHERE id=? AND availability='available'
+        """, (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), book_id))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            flash("Sorry, this book is no longer available.", "error")
+            return redirect(url_for("book", book_id=book_id))
+
         transaction_code = f"LF{datetime.now().strftime('%Y%m%d')}{random.randint(1000,9999)}"
 
         cursor.execute("""
-            INSERT INTO orders (book_id, buyer_id, order_type, rent_months, total_price, transaction_code, status)
-            VALUES (?, ?, ?, ?, ?, ?, 'pending')
-        """, (book_id, session["user_id"], order_type, rent_months, total_price, transaction_code))
+            INSERT INTO orders (book_id, buyer_id, order_type, rent_months, total_price, transaction_code, status, category)
+            VALUES (?, ?, ?, ?, ?, ?, 'pending', ?)
+        """, (book_id, session["user_id"], order_type, rent_months, total_price, transaction_code, book["category"] or ""))
         order_id = cursor.lastrowid
 
-        buyer_email = session.get("user_email", "Unknown")
-        message = f"{buyer_email} placed an order for your book '{book['title']}'."
         cursor.execute("""
-            INSERT INTO notifications (sender_id, receiver_id, book_id, order_id, message, status)
-            VALUES (?, ?, ?, ?, ?, 'pending')
-        """, (session["user_id"], book["owner_id"], book_id, order_id, message))
+            INSERT INTO notifications (sender_id, receiver_id, book_id, order_id, event_type, status)
+            VALUES (?, ?, ?, ?, 'order_placed', 'pending')
+        """, (session["user_id"], book["owner_id"], book_id, order_id))
 
         cursor.execute("SELECT full_name, email, phone FROM users WHERE id = ?", (book["owner_id"],))
         owner = cursor.fetchone()
@@ -365,10 +690,16 @@ def create_order(book_id, order_type):
             "owner_name": owner["full_name"],
             "owner_email": owner["email"],
             "owner_phone": owner["phone"],
-            "qr_code": None
+            "buyer_name": session.get("user_name"),
+            "status": "pending",
+            # The QR code is generated once, by receipt_renderer after the
+            # commit; the card links to the cached receipt instead
+            "qr_svg": None
         }
 
         conn.commit()
+        sync_suggest_index(cursor, removed=[book])
+        receipt_renderer.schedule([order_id], DB_PATH)
         flash("Order placed successfully! The owner will review your request.", "success")
         # http://127.0.0.1:5000/receipt/11
         return render_template("receipt.html", order=order)
@@ -382,6 +713,91 @@ def create_order(book_id, order_type):
         conn.close()
 
 
+ORDER_ACTIONS = {"accept": "accepted", "reject": "rejected"}
+
+
+def apply_order_action(cursor, owner_id, order_ids, status):
+    """Set status ('accepted'/'rejected') on an owner's pending orders and notify the buyers.
+
+    Ownership and current status are checked in one query, so orders that belong
+    to someone else or were already handled are skipped. The books move from
+    reserved to sold/rented (accept; skipped if the copy is no longer reserved)
+    or back to available (reject). Opens the transaction with the write lock
+    held (the caller commits) and returns (ids of the orders that changed,
+    books rows that changed) for sync_suggest_index.
+    """
+    if not order_ids:
+        return [], []
+    # sqlite3 would only BEGIN at the first UPDATE; take the write lock before
+    # the SELECT so a concurrent accept/reject cannot act on the same orders
+    if not cursor.connection.in_transaction:
+        cursor.execute("BEGIN IMMEDIATE")
+    placeholders = ",".join("?" * len(order_ids))
+    cursor.execute(f"""
+        SELECT o.id, o.book_id, o.buyer_id, o.order_type
+        FROM orders o
+        JOIN books b ON o.book_id = b.id
+        WHERE o.id IN ({placeholders}) AND b.owner_id = ? AND o.status = 'pending'
+    """, [*order_ids, owner_id])
+    orders = cursor.fetchall()
+    if not orders:
+        return [], []
+
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    books_changed = []
+    if status == "accepted":
+        # An order is only accepted if its reserved copy becomes sold/rented
+        # here: the oldest order wins when a (legacy) book has several pending
+        by_book = {}
+        for order in sorted(orders, key=lambda order: order["id"]):
+            by_book.setdefault(order["book_id"], order)
+        transitioned = set()
+        for availability, order_type in (("sold", "buy"), ("rented", "rent")):
+            book_ids = [book_id for book_id, order in by_book.items() if order["order_type"] == order_type]
+            if book_ids:
+                cursor.execute(f"""
+                    UPDATE books SET availability=?, updated_at=?
+                    WHERE id IN ({",".join("?" * len(book_ids))}) AND availability='reserved'
+                    RETURNING id, title, author, category, availability
+                """, [availability, now, *book_ids])
+                books_changed.extend(cursor.fetchall())
+        transitioned = {book["id"] for book in books_changed}
+        orders = [order for order in by_book.values() if order["book_id"] in transitioned]
+        if not orders:
+            return [], books_changed
+
+    placeholders = ",".join("?" * len(orders))
+    cursor.execute(f"""
+        UPDATE orders SET status=? WHERE id IN ({placeholders}) AND status='pending'
+        RETURNING id, book_id, buyer_id, order_type
+    """, [status, *[order["id"] for order in orders]])
+    # Notify and transition only what this statement actually changed
+    orders = cursor.fetchall()
+    if not orders:
+        return [], books_changed
+    ids = [order["id"] for order in orders]
+    placeholders = ",".join("?" * len(ids))
+    cursor.execute(f"""
+        DELETE FROM notifications WHERE receiver_id=? AND order_id IN ({placeholders})
+    """, [owner_id, *ids])
+
+    if status == "rejected":
+        # The copy is released unless another order is still waiting for it
+        book_ids = [order["book_id"] for order in orders]
+        cursor.execute(f"""
+            UPDATE books SET availability='available', updated_at=?
+            WHERE id IN ({",".join("?" * len(book_ids))}) AND availability='reserved'
+              AND NOT EXISTS (SELECT 1 FROM orders WHERE book_id = books.id AND status = 'pending')
+            RETURNING id, title, author, category, availability
+        """, [now, *book_ids])
+        books_changed.extend(cursor.fetchall())
+    cursor.executemany("""
+        INSERT INTO notifications (sender_id, receiver_id, book_id, order_id, event_type, status)
+        VALUES (?, ?, ?, ?, ?, 'done')
+    """, [(owner_id, order["buyer_id"], order["book_id"], order["id"], f"order_{status}") for order in orders])
+    return ids, books_changed
+
+
 @app.route("/owner/order/<int:order_id>/accept", methods=["POST"])
 @login_required
 def accept_order(order_id):
@@ -389,27 +805,15 @@ def accept_order(order_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("""
-            SELECT o.*, b.owner_id, b.title AS book_title, o.book_id, o.buyer_id
-            FROM orders o
-            JOIN books b ON o.book_id = b.id
-            WHERE o.id = ?
-        """, (order_id,))
-        order = cursor.fetchone()
-        if not order or order["owner_id"] != session["user_id"]:
-            flash("Unauthorized.", "error")
+        changed, books_changed = apply_order_action(cursor, session["user_id"], [order_id], "accepted")
+        if not changed:
+            conn.rollback()
+            flash("Order not found or already handled.", "error")
             return redirect(url_for("profile"))
 
-        cursor.execute("UPDATE orders SET status='accepted' WHERE id=?", (order_id,))
-        cursor.execute("DELETE FROM notifications WHERE order_id=? AND receiver_id=?", (order_id, session["user_id"]))
-
-        message = f"Your order for '{order['book_title']}' has been accepted."
-        cursor.execute("""
-            INSERT INTO notifications (sender_id, receiver_id, book_id, order_id, message, status)
-            VALUES (?, ?, ?, ?, ?, 'done')
-        """, (session["user_id"], order["buyer_id"], order["book_id"], order_id, message))
-
         conn.commit()
+        sync_suggest_index(cursor, added=books_changed, bumps=len(books_changed))
+        receipt_renderer.schedule([order_id], DB_PATH)
         flash("Order accepted.", "success")
     except sqlite3.Error as e:
         conn.rollback()
@@ -426,27 +830,15 @@ def reject_order(order_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("""
-            SELECT o.*, b.owner_id, b.title AS book_title, o.book_id, o.buyer_id
-            FROM orders o
-            JOIN books b ON o.book_id = b.id
-            WHERE o.id = ?
-        """, (order_id,))
-        order = cursor.fetchone()
-        if not order or order["owner_id"] != session["user_id"]:
-            flash("Unauthorized.", "error")
+        changed, books_changed = apply_order_action(cursor, session["user_id"], [order_id], "rejected")
+        if not changed:
+            conn.rollback()
+            flash("Order not found or already handled.", "error")
             return redirect(url_for("profile"))
 
-        cursor.execute("UPDATE orders SET status='rejected' WHERE id=?", (order_id,))
-        cursor.execute("DELETE FROM notifications WHERE order_id=? AND receiver_id=?", (order_id, session["user_id"]))
-
-        message = f"Your order for '{order['book_title']}' has been rejected."
-        cursor.execute("""
-            INSERT INTO notifications (sender_id, receiver_id, book_id, order_id, message, status)
-            VALUES (?, ?, ?, ?, ?, 'done')
-        """, (session["user_id"], order["buyer_id"], order["book_id"], order_id, message))
-
         conn.commit()
+        sync_suggest_index(cursor, added=books_changed, bumps=len(books_changed))
+        receipt_renderer.schedule([order_id], DB_PATH)
         flash("Order rejected.", "info")
     except sqlite3.Error as e:
         conn.rollback()
@@ -456,28 +848,51 @@ def reject_order(order_id):
     return redirect(url_for("profile"))
 
 
-@app.route("/receipt/<int:order_id>")
+@app.route("/owner/orders/bulk", methods=["POST"])
 @login_required
-def receipt(order_id):
-    """Display order receipt for buyer or seller."""
+def bulk_order_action():
+    """Accept or reject several pending orders at once (owner action)."""
+    status = ORDER_ACTIONS.get(request.form.get("action"))
+    order_ids = request.form.getlist("order_ids", type=int)
+    if not status or not order_ids:
+        flash("Select at least one order and an action.", "error")
+        return redirect(url_for("profile"))
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        changed, books_changed = apply_order_action(cursor, session["user_id"], order_ids, status)
+        conn.commit()
+        sync_suggest_index(cursor, added=books_changed, bumps=len(books_changed))
+        receipt_renderer.schedule(changed, DB_PATH)
+        flash(f"{len(changed)} order(s) {status}.", "success")
+        skipped = len(set(order_ids)) - len(changed)
+        if skipped:
+            flash(f"{skipped} order(s) were skipped (not yours or already handled).", "warning")
+    except sqlite3.Error as e:
+        conn.rollback()
+        flash(f"Database error: {e}", "error")
+    finally:
+        conn.close()
+    return redirect(url_for("profile"))
+
+
+def send_receipt(order_id, download=False):
+    """Serve the cached receipt for an order, rendering it first on a cache miss.
+
+    Only a primary-key lookup runs per view (access check and cache key);
+    the full receipt query runs once per order status.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
 
     try:
         cursor.execute("""
-            SELECT o.id AS order_id, o.book_id, o.buyer_id, o.order_type, o.rent_months, 
-                   o.total_price, o.status, o.created_at,
-                   b.title AS book_title, b.author, b.category, b.condition, b.image,
-                   b.owner_id,
-                   u1.full_name AS owner_name, u1.email AS owner_email, u1.phone AS owner_phone,
-                   u2.full_name AS buyer_name, u2.email AS buyer_email, u2.phone AS buyer_phone
+            SELECT o.buyer_id, o.status, o.transaction_code, b.owner_id
             FROM orders o
             JOIN books b ON o.book_id = b.id
-            JOIN users u1 ON b.owner_id = u1.id
-            JOIN users u2 ON o.buyer_id = u2.id
             WHERE o.id = ?
         """, (order_id,))
-
         order = cursor.fetchone()
 
         if not order:
@@ -488,13 +903,35 @@ def receipt(order_id):
             flash("Unauthorized access to this receipt.", "error")
             return redirect(url_for("profile"))
 
-        order = dict(order)
-        order["created_at"] = datetime.strptime(order["created_at"], "%Y-%m-%d %H:%M:%S")
+        filename = receipt_path(order_id, order["status"])
+        if not os.path.exists(os.path.join(RECEIPT_DIR, filename)):
+            filename = write_receipt(conn, order_id, render_receipt_document)
 
     finally:
         conn.close()
 
-    return render_template("receipt.html", order=order)
+    response = send_from_directory(
+        os.path.abspath(RECEIPT_DIR), filename,
+        as_attachment=download,
+        download_name=f"receipt-{order['transaction_code'] or order_id}.html",
+        max_age=0
+    )
+    response.cache_control.private = True
+    return response
+
+
+@app.route("/receipt/<int:order_id>")
+@login_required
+def receipt(order_id):
+    """Display order receipt for buyer or seller."""
+    return send_receipt(order_id)
+
+
+@app.route("/receipt/<int:order_id>/download")
+@login_required
+def download_receipt(order_id):
+    """Download the printable receipt file."""
+    return send_receipt(order_id, download=True)
 
 
 # =============================
@@ -502,6 +939,9 @@ def receipt(order_id):
 # =============================
 # Purpose: Manage user profile, view orders, notifications, and clear notifications
 
+app.add_template_filter(render_notification, "notification_message")
+
+
 @app.route("/profile")
 @login_required
 def profile():
@@ -547,7 +987,8 @@ def profile():
         user_book_orders = cursor.fetchall()
 
         cursor.execute("""
-            SELECT n.*, u.full_name AS sender_name, b.title AS book_title, b.owner_id AS book_owner_id
+            SELECT n.*, u.full_name AS sender_name, u.email AS sender_email,
+                   b.title AS book_title, b.owner_id AS book_owner_id
             FROM notifications n
             JOIN users u ON n.sender_id = u.id
             LEFT JOIN books b ON n.book_id = b.id
@@ -556,6 +997,11 @@ def profile():
         """, (user_id,))
         notifications = cursor.fetchall()
 
+        cursor.execute("""
+            SELECT * FROM saved_searches WHERE user_id = ? ORDER BY created_at DESC
+        """, (user_id,))
+        saved_searches = cursor.fetchall()
+
     finally:
         conn.close()
 
@@ -565,7 +1011,8 @@ def profile():
         orders=orders,
         user_books=user_books,
         user_book_orders=user_book_orders,
-        notifications=notifications
+        notifications=notifications,
+        saved_searches=saved_searches
     )
 
 
@@ -610,6 +1057,45 @@ def clear_notifications():
     return redirect(url_for("profile"))
 
 
+@app.route("/saved_searches", methods=["POST"])
+@login_required
+def save_search():
+    """Save the current /books filters and get notified about new matching listings."""
+    name = request.form.get("name", "").strip()
+    author = request.form.get("author", "").strip()
+    category = request.form.get("category", "").strip()
+    max_price = request.form.get("max_price", type=int)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO saved_searches (user_id, name, author, category, max_price)
+            VALUES (?, ?, ?, ?, ?)
+        """, (session["user_id"], name, author, category, max_price))
+        index_saved_search(cursor, cursor.lastrowid, name, author, category, max_price)
+        conn.commit()
+        flash("Search saved. We'll notify you about new matching books.", "success")
+    finally:
+        conn.close()
+    return redirect(url_for("books", name=name, author=author, category=category, max_price=max_price))
+
+
+@app.route("/saved_searches/<int:search_id>/delete", methods=["POST"])
+@login_required
+def delete_saved_search(search_id):
+    """Delete one of the user's saved searches."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM saved_searches WHERE id = ? AND user_id = ?", (search_id, session["user_id"]))
+        conn.commit()
+        flash("Saved search removed.", "success")
+    finally:
+        conn.close()
+    return redirect(url_for("profile"))
+
+
 # =============================
 # 7. BOOK MANAGEMENT
 # =============================
@@ -629,20 +1115,27 @@ def add_book():
     location = request.form["location"]
     cover_image = request.files.get("cover_image")
 
-    filename = None
-    if cover_image and cover_image.filename:
-        filename = f"{int(datetime.now().timestamp())}_{cover_image.filename}"
-        cover_image.save(f"static/images/Book/{filename}")
+    lat, lon = geocode(location) or (None, None)
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
+        filename = None
+        if cover_image and cover_image.filename:
+            try:
+                filename = save_cover(cursor, cover_image)
+            except ValueError as e:
+                flash(str(e), "error")
+                return redirect(url_for("profile"))
+
         cursor.execute("""
             INSERT INTO books (
               owner_id, title, author, category, description,
-              condition, buy_price, rent_price, location, image, created_at
+              condition, buy_price, rent_price, location, image, created_at,
+              updated_at, lat, lon
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             session["user_id"],
             title,
@@ -654,9 +1147,21 @@ def add_book():
             rent_price,
             location,
             filename,
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            now,
+            now,
+            lat,
+            lon
         ))
+        book_id = cursor.lastrowid
+        index_book(cursor, book_id, title, author)
+
+        # Alert buyers whose saved searches match the new listing
+        matches = matching_searches(cursor, session["user_id"], title, author, category, buy_price)
+        notify_matches(cursor, book_id, session["user_id"], matches)
+
         conn.commit()
+        sync_suggest_index(cursor, added=[{"title": title, "author": author, "category": category,
+                                           "availability": "available"}])
         flash("Book added successfully!", "success")
     finally:
         conn.close()
@@ -688,15 +1193,20 @@ def edit_book(book_id):
 
             cover_image = request.files.get("cover_image")
             filename = book["image"]
-            if cover_image:
-                filename = f"{datetime.now().timestamp()}_{cover_image.filename}"
-                cover_image.save(f"static/images/Book/{filename}")
+            if cover_image and cover_image.filename:
+                try:
+                    filename = save_cover(cursor, cover_image)
+                except ValueError as e:
+                    flash(str(e), "error")
+                    return redirect(url_for("edit_book", book_id=book_id))
 
             condition = request.form.get("condition", "Like New")
+            lat, lon = geocode(location) or (None, None)
             cursor.execute("""
                 UPDATE books
                 SET title=?, author=?, category=?, description=?, condition=?,
-                    buy_price=?, rent_price=?, location=?, image=?
+                    buy_price=?, rent_price=?, location=?, image=?, lat=?, lon=?,
+                    updated_at=?
                 WHERE id=?
             """, (
                 title,
@@ -708,10 +1218,16 @@ def edit_book(book_id):
                 rent_price,
                 location,
                 filename,
+                lat,
+                lon,
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 book_id
             ))
+            index_book(cursor, book_id, title, author)
 
             conn.commit()
+            sync_suggest_index(cursor, removed=[book], added=[{"title": title, "author": author, "category": category,
+                                                              "availability": book["availability"]}])
             flash("Book updated successfully!", "success")
             return redirect(url_for("profile"))
 
@@ -735,6 +1251,7 @@ def delete_book(book_id):
 
         cursor.execute("DELETE FROM books WHERE id=?", (book_id,))
         conn.commit()
+        sync_suggest_index(cursor, removed=[book])
         flash("Book deleted successfully!", "success")
     # except sqlite3.Error:
     #     conn.rollback()
@@ -774,6 +1291,49 @@ def admin():
     return render_template("admin.html", users=users, books=books)
 
 
+@app.route("/admin/analytics")
+@login_required
+def admin_analytics():
+    """Display sales and rental analytics (read from the order rollups only)."""
+    if session.get("role") not in ["admin", "super_admin"]:
+        flash("Access denied.", "error")
+        return redirect(url_for("home"))
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        stats = dashboard_stats(cursor)
+    finally:
+        conn.close()
+    return render_template("admin_analytics.html", stats=stats)
+
+
+@app.route("/admin/profiles")
+def admin_profiles():
+    """List recent request profiles."""
+    if session.get("role") not in ["admin", "super_admin"]:
+        flash("Access denied.", "error")
+        return redirect(url_for("home"))
+
+    return render_template(
+        "admin_profiles.html",
+        captures=load_captures(),
+        keep=PROFILE_KEEP,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        header=PROFILE_HEADER
+    )
+
+
+@app.route("/admin/profiles/<capture_id>.folded")
+def admin_profile_download(capture_id):
+    """Download a capture's folded stacks (flame graph input)."""
+    if session.get("role") not in ["admin", "super_admin"]:
+        flash("Access denied.", "error")
+        return redirect(url_for("home"))
+
+    return send_from_directory(os.path.abspath(PROFILE_DIR), f"{capture_id}.folded", as_attachment=True)
+
+
 @app.route("/admin/promote/<int:user_id>", methods=["POST"])
 @login_required
 def promote_user(user_id):
@@ -835,8 +1395,12 @@ def admin_delete_book(book_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
+        cursor.execute("SELECT title, author, category, availability FROM books WHERE id=?", (book_id,))
+        book = cursor.fetchone()
         cursor.execute("DELETE FROM books WHERE id=?", (book_id,))
         conn.commit()
+        if book:
+            sync_suggest_index(cursor, removed=[book])
         flash("Book removed.", "success")
     except sqlite3.Error:
         conn.rollback()
@@ -878,4 +1442,7 @@ def admin_delete_user(user_id):
 # RUN APPLICATION
 # =============================
 if __name__ == "__main__":
+    # The debug reloader runs this file twice; only its child serves requests
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_jobs()
     app.run(debug=True, port=4000)
\ No newline at end of file
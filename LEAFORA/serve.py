@@ -0,0 +1,384 @@
+"""Production launcher for LEAFORA.
+
+The master process binds the listening socket and forks worker processes.
+Each worker imports the app, warms it up (templates, database, caches) and
+only then reports ready and starts accepting connections on the shared
+socket, serving up to --threads requests at a time. The periodic jobs (image
+GC, database maintenance; see app.start_background_jobs) run once, in a
+separate jobs process, never in the workers.
+
+Signals (to the master):
+  HUP       graceful reload: start a new set of workers with freshly imported
+            code, and retire the old ones once the new ones are ready
+  TERM/INT  graceful shutdown: workers finish in-flight requests and exit
+
+Configuration comes from the environment (command line flags override):
+  LEAFORA_SECRET_KEY   session signing key (required)
+  LEAFORA_DB_PATH      SQLite database path (default: database.db)
+  LEAFORA_HOST, LEAFORA_PORT, LEAFORA_WORKERS, LEAFORA_THREADS
+
+Usage (from the project root):
+  LEAFORA_SECRET_KEY=... python serve.py --workers 4 --threads 8
+  python serve.py --benchmark     # cold start timings as JSON
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import select
+import signal
+import socket
+import threading
+import time
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_THREADS = 4
+GRACEFUL_TIMEOUT = 30  # seconds old workers get to finish their requests
+READY_TIMEOUT = 60  # seconds a new worker gets to import and warm up
+LISTEN_BACKLOG = 128
+
+# GET requests replayed through the test client before a worker accepts
+# traffic: they build the URL map, the suggest index and the gazetteer, and
+# pull the catalog tables and indexes into the page cache.
+WARMUP_PATHS = ("/", "/books", "/books?near=Dhaka", "/suggest?q=a")
+
+logger = logging.getLogger("leafora.serve")
+
+
+class RequestHandler(WSGIRequestHandler):
+    # One request per connection, so an idle keep-alive client never holds
+    # one of a worker's few threads
+    protocol_version = "HTTP/1.0"
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server that handles at most `threads` requests at once.
+
+    When every thread is busy the worker stops accepting, leaving new
+    connections in the shared backlog for the other workers.
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads, fd=None):
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        self.slots = threading.BoundedSemaphore(threads)
+        self.active = set()
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        thread = threading.Thread(target=self.process_request_thread, args=(request, client_address), daemon=True)
+        self.active.add(thread)
+        thread.start()
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.active.discard(threading.current_thread())
+            self.slots.release()
+
+    def drain(self):
+        """Wait for in-flight requests after serve_forever() returned."""
+        for thread in list(self.active):
+            thread.join()
+
+
+def load_app():
+    """Import app.py; returns the module (the Flask app is module.app)."""
+    if not os.environ.get("LEAFORA_SECRET_KEY"):
+        raise SystemExit("LEAFORA_SECRET_KEY must be set to run the production server.")
+    return importlib.import_module("app")
+
+
+def warm_up(leafora):
+    """Compile every template and replay WARMUP_PATHS; returns seconds per step."""
+    timings = {}
+
+    started = time.perf_counter()
+    env = leafora.app.jinja_env
+    for name in env.list_templates():
+        env.get_template(name)
+    timings["templates"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    conn = leafora.get_db_connection()
+    try:
+        # Parses the schema once and fails fast on a missing/unmigrated database
+        conn.execute("SELECT availability FROM books LIMIT 1").fetchall()
+    finally:
+        conn.close()
+    timings["database"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with leafora.app.test_client() as client:
+        for path in WARMUP_PATHS:
+            response = client.get(path)
+            if response.status_code >= 500:
+                raise RuntimeError(f"Warm-up request {path} failed with {response.status_code}")
+    timings["requests"] = time.perf_counter() - started
+    return timings
+
+
+def run_jobs():
+    """Jobs process body: run app.start_background_jobs() until SIGTERM.
+
+    Returns at once when no job is configured.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+
+    leafora = load_app()
+    if not leafora.start_background_jobs():
+        return
+    logger.info("Jobs process %s started", os.getpid())
+    while not stopped.wait(1):
+        pass
+
+
+def run_worker(listener, ready_fd, threads):
+    """Worker process body: import, warm up, report ready, serve until SIGTERM."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C reaches the whole group; the master handles it
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    leafora = load_app()
+    timings = warm_up(leafora)
+    host, port = listener.getsockname()[:2]
+    server = PooledWSGIServer(host, port, leafora.app, threads, fd=listener.fileno())
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, so it cannot run
+        # on the thread that is inside serve_forever()
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    logger.info("Worker %s ready (%s)", os.getpid(),
+                ", ".join(f"{step} {seconds * 1000:.0f} ms" for step, seconds in timings.items()))
+    os.write(ready_fd, b"1")
+    os.close(ready_fd)
+
+    server.serve_forever()
+    server.drain()
+    server.server_close()
+
+
+class Launcher:
+    """Master process: owns the socket, forks, reloads and reaps workers."""
+
+    def __init__(self, host, port, workers, threads, graceful_timeout=GRACEFUL_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.graceful_timeout = graceful_timeout
+        self.listener = None
+        self.current = set()  # pids of the serving generation
+        self.jobs_pid = None
+        self.retiring = {}  # pid -> deadline for workers being shut down
+        self.reload_requested = False
+        self.stop_requested = False
+
+    def spawn(self):
+        """Fork a worker; returns (pid, fd that becomes readable once it is ready)."""
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            code = 0
+            try:
+                run_worker(self.listener, ready_w, self.threads)
+            except BaseException:
+                logger.exception("Worker %s failed", os.getpid())
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+        os.close(ready_w)
+        return pid, ready_r
+
+    def spawn_jobs(self):
+        """Fork the single process that runs the periodic jobs."""
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self.listener.close()
+                run_jobs()
+            except BaseException:
+                logger.exception("Jobs process %s failed", os.getpid())
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+        self.jobs_pid = pid
+
+    def spawn_generation(self, count):
+        """Start `count` workers and wait for them to warm up; returns the ready pids."""
+        pending = dict(self.spawn() for _ in range(count))
+        fds = {fd: pid for pid, fd in pending.items()}
+        ready = set()
+        deadline = time.monotonic() + READY_TIMEOUT
+        while fds and time.monotonic() < deadline:
+            readable, _, _ = select.select(list(fds), [], [], max(0.0, deadline - time.monotonic()))
+            for fd in readable:
+                if os.read(fd, 1):
+                    ready.add(fds[fd])
+                os.close(fd)
+                del fds[fd]
+        for fd, pid in fds.items():
+            os.close(fd)
+        for pid in set(pending) - ready:
+            logger.error("Worker %s did not become ready", pid)
+            self.retire(pid, deadline=time.monotonic())
+        return ready
+
+    def retire(self, pid, deadline=None):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        self.retiring[pid] = deadline if deadline is not None else time.monotonic() + self.graceful_timeout
+
+    def reload(self):
+        logger.info("Reloading: starting %s new workers", self.workers)
+        new = self.spawn_generation(self.workers)
+        if len(new) < self.workers:
+            # Keep serving with the old code rather than with a partial pool
+            logger.error("Reload aborted: only %s of %s new workers started", len(new), self.workers)
+            for pid in new:
+                self.retire(pid)
+            return
+        old, self.current = self.current, new
+        for pid in old:
+            self.retire(pid)
+        # Restart the jobs with the new code; their first run is a full
+        # interval away, so they never overlap with the old process's
+        if self.jobs_pid is not None:
+            self.retire(self.jobs_pid)
+        self.spawn_jobs()
+        logger.info("Reload complete")
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.retiring.pop(pid, None)
+            if pid == self.jobs_pid:
+                self.jobs_pid = None
+                if os.waitstatus_to_exitcode(status) != 0 and not self.stop_requested:
+                    logger.warning("Jobs process %s exited unexpectedly, restarting", pid)
+                    self.spawn_jobs()
+            if pid in self.current:
+                self.current.discard(pid)
+                logger.warning("Worker %s exited unexpectedly (status %s)", pid, status)
+
+    def kill_overdue(self):
+        now = time.monotonic()
+        for pid, deadline in list(self.retiring.items()):
+            if now >= deadline:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def run(self):
+        self.listener = socket.create_server((self.host, self.port), backlog=LISTEN_BACKLOG)
+        self.listener.set_inheritable(True)
+        signal.signal(signal.SIGHUP, lambda signum, frame: setattr(self, "reload_requested", True))
+        signal.signal(signal.SIGTERM, lambda signum, frame: setattr(self, "stop_requested", True))
+        signal.signal(signal.SIGINT, lambda signum, frame: setattr(self, "stop_requested", True))
+
+        logger.info("Master %s listening on http://%s:%s (%s workers x %s threads)",
+                    os.getpid(), self.host, self.port, self.workers, self.threads)
+        self.current = self.spawn_generation(self.workers)
+        if not self.current:
+            self.listener.close()
+            raise SystemExit("No worker could be started.")
+        self.spawn_jobs()
+
+        while not self.stop_requested:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+            self.reap()
+            self.kill_overdue()
+            missing = self.workers - len(self.current)
+            if missing > 0 and not self.stop_requested:
+                self.current |= self.spawn_generation(missing)
+            time.sleep(0.5)
+
+        logger.info("Shutting down")
+        for pid in self.current:
+            self.retire(pid)
+        self.current = set()
+        if self.jobs_pid is not None:
+            self.retire(self.jobs_pid)
+        while self.retiring:
+            self.reap()
+            self.kill_overdue()
+            time.sleep(0.1)
+        self.listener.close()
+
+
+def benchmark():
+    """Cold start timings for this process: app import, warm-up steps, first request."""
+    started = time.perf_counter()
+    leafora = load_app()
+    timings = {"import": time.perf_counter() - started}
+    timings.update(warm_up(leafora))
+    started = time.perf_counter()
+    with leafora.app.test_client() as client:
+        client.get("/books")
+    timings["first_request"] = time.perf_counter() - started
+    timings["total"] = timings["import"] + timings["templates"] + timings["database"] + timings["requests"]
+    return {step: round(seconds, 4) for step, seconds in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run LEAFORA with preforked worker processes.")
+    parser.add_argument("--host", default=os.environ.get("LEAFORA_HOST", DEFAULT_HOST))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("LEAFORA_PORT", DEFAULT_PORT)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("LEAFORA_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("LEAFORA_THREADS", DEFAULT_THREADS)))
+    parser.add_argument("--graceful-timeout", type=int, default=GRACEFUL_TIMEOUT)
+    parser.add_argument("--pid-file", help="write the master pid here (for kill -HUP)")
+    parser.add_argument("--benchmark", action="store_true", help="print cold start timings as JSON and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(levelname)s %(message)s")
+
+    if args.benchmark:
+        print(json.dumps(benchmark()))
+        return
+    if args.workers < 1 or args.threads < 1:
+        parser.error("--workers and --threads must be at least 1")
+    if not hasattr(os, "fork"):
+        parser.error("serve.py needs os.fork (Linux/macOS); on Windows use a WSGI server such as waitress")
+    if not os.environ.get("LEAFORA_SECRET_KEY"):
+        parser.error("LEAFORA_SECRET_KEY must be set")
+
+    if args.pid_file:
+        with open(args.pid_file, "w") as f:
+            f.write(str(os.getpid()))
+    try:
+        Launcher(args.host, args.port, args.workers, args.threads, args.graceful_timeout).run()
+    finally:
+        if args.pid_file and os.path.exists(args.pid_file):
+            os.remove(args.pid_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -134,6 +134,10 @@ document.addEventListener("DOMContentLoaded", () => {
 
     if (filterForm && booksGrid) {
         filterForm.addEventListener("submit", (e) => {
+            // Buttons like "Save Search" post the form normally
+            if (e.submitter && e.submitter.hasAttribute("data-native-submit")) {
+                return;
+            }
             e.preventDefault();
 
             const formData = new FormData(filterForm);
@@ -148,3 +152,55 @@ document.addEventListener("DOMContentLoaded", () => {
         });
     }
 });
+
+
+// -----------------------------
+// Autocomplete Suggestions (/suggest)
+// -----------------------------
+// Debounced per keystroke; a newer request aborts the one still in flight.
+document.addEventListener("DOMContentLoaded", () => {
+    const SUGGEST_DELAY_MS = 150;
+
+    document.querySelectorAll("input[data-suggest]").forEach(input => {
+        const kind = input.dataset.suggest;
+        const list = document.getElementById(input.getAttribute("list"));
+        let timer = null;
+        let controller = null;
+
+        if (!list) {
+            return;
+        }
+
+        input.addEventListener("input", () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => {
+                const prefix = input.value.trim();
+                if (controller) {
+                    controller.abort();
+                }
+                if (!prefix) {
+                    list.innerHTML = "";
+                    return;
+                }
+
+                controller = new AbortController();
+                const params = new URLSearchParams({ q: prefix, kind: kind });
+                fetch("/suggest?" + params.toString(), { signal: controller.signal })
+                    .then(res => res.json())
+                    .then(data => {
+                        list.innerHTML = "";
+                        (data[kind] || []).forEach(value => {
+                            const option = document.createElement("option");
+                            option.value = value;
+                            list.appendChild(option);
+                        });
+                    })
+                    .catch(err => {
+                        if (err.name !== "AbortError") {
+                            console.error(err);
+                        }
+                    });
+            }, SUGGEST_DELAY_MS);
+        });
+    });
+});
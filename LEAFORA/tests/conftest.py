@@ -0,0 +1,124 @@
+import os
+import random
+import runpy
+import shutil
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "utils"))  # init_db.py imports `db` as a top-level module
+
+import app as leafora  # noqa: E402
+from utils.db import get_db_connection  # noqa: E402
+from utils.trigram import index_book  # noqa: E402
+from utils.saved_searches import index_saved_search  # noqa: E402
+
+SEED_BOOKS = 300
+SEED_SAVED_SEARCHES = 200
+CATEGORIES = ["Novel", "Fantasy", "Focus", "Financial", "Social", "Science"]
+LOCATIONS = ["Dhaka", "Chittagong", "Mirpur, Dhaka", "Sylhet", "Khulna", "Nowhere"]
+
+# Users: 1 = super admin, 2 = seller, 3 = buyer
+ADMIN_ID, SELLER_ID, BUYER_ID = 1, 2, 3
+
+
+def seed(conn):
+    """Fill a freshly initialised database with a deterministic catalog."""
+    rng = random.Random(42)
+    cursor = conn.cursor()
+    cursor.executemany("""
+        INSERT INTO users (id, full_name, email, password_hash, phone, address, role)
+        VALUES (?, ?, ?, ?, '01700000000', 'Dhaka', ?)
+    """, [
+        (ADMIN_ID, "Admin", "admin@email.com", "x", "super_admin"),
+        (SELLER_ID, "Seller", "seller@example.com", "x", "user"),
+        (BUYER_ID, "Buyer", "buyer@example.com", "x", "user"),
+    ])
+
+    for i in range(1, SEED_BOOKS + 1):
+        title = f"Book {i} {rng.choice(['Atomic', 'Deep', 'Rich', 'Lord', 'Great'])} {rng.choice(['Habits', 'Work', 'Rings', 'Gatsby'])}"
+        author = rng.choice(["James Clear", "Cal Newport", "Robert Kiyosaki", "Paulo Coelho", "J.R.R. Tolkien"])
+        location = rng.choice(LOCATIONS)
+        lat, lon = leafora.geocode(location) or (None, None)
+        cursor.execute("""
+            INSERT INTO books (owner_id, title, author, category, description, condition,
+                               buy_price, rent_price, location, image, created_at, updated_at, lat, lon)
+            VALUES (?, ?, ?, ?, '', 'Good', ?, ?, ?, NULL, '2025-01-01 00:00:00', '2025-01-01 00:00:00', ?, ?)
+        """, (SELLER_ID if i % 10 else BUYER_ID, title, author, rng.choice(CATEGORIES),
+              rng.randint(100, 1500), rng.choice([None, 50, 100]), location, lat, lon))
+        index_book(cursor, cursor.lastrowid, title, author)
+
+    for book_id in range(1, 21):
+        cursor.execute("""
+            INSERT INTO orders (book_id, buyer_id, order_type, rent_months, total_price, status, transaction_code)
+            VALUES (?, ?, 'buy', NULL, 500, ?, ?)
+        """, (book_id, BUYER_ID, "accepted" if book_id == 1 else "pending", f"LFTEST{book_id:04d}"))
+        cursor.execute("UPDATE books SET availability = ? WHERE id = ?",
+                       ("sold" if book_id == 1 else "reserved", book_id))
+        cursor.execute("""
+            INSERT INTO notifications (sender_id, receiver_id, book_id, order_id, event_type, status)
+            VALUES (?, ?, ?, ?, 'order_placed', 'pending')
+        """, (BUYER_ID, SELLER_ID, book_id, cursor.lastrowid))
+        cursor.execute("""
+            INSERT INTO reviews (book_id, user_id, rating, comment) VALUES (?, ?, 4, 'Good read')
+        """, (book_id, BUYER_ID))
+
+    # Saved searches from the buyer and the admin, so add_book runs the matching
+    for i in range(SEED_SAVED_SEARCHES):
+        name, author, category = rng.choice([
+            ("", "", rng.choice(CATEGORIES)),
+            ("", rng.choice(["Newport", "Tolkein", "New Autor", "Clear"]), ""),
+            (rng.choice(["Atomic", "Gatsby", "New Bok", "Rings"]), "", ""),
+            ("", "", ""),
+        ])
+        max_price = rng.choice([None, 200, 1500])
+        cursor.execute("""
+            INSERT INTO saved_searches (user_id, name, author, category, max_price)
+            VALUES (?, ?, ?, ?, ?)
+        """, (BUYER_ID if i % 2 else ADMIN_ID, name, author, category, max_price))
+        index_saved_search(cursor, cursor.lastrowid, name, author, category, max_price)
+    conn.commit()
+
+
+@pytest.fixture(scope="session")
+def seeded_db(tmp_path_factory):
+    """Path to a seeded template database, built once per test session."""
+    build_dir = tmp_path_factory.mktemp("seed")
+    cwd = os.getcwd()
+    os.chdir(build_dir)  # utils/db.py opens "database.db" relative to the working directory
+    try:
+        runpy.run_path(os.path.join(PROJECT_ROOT, "utils", "init_db.py"))
+        conn = get_db_connection()
+        seed(conn)
+        conn.close()
+    finally:
+        os.chdir(cwd)
+    return build_dir / "database.db"
+
+
+@pytest.fixture
+def db_dir(seeded_db, tmp_path, monkeypatch):
+    """Working directory holding a fresh copy of the seeded database."""
+    shutil.copy(seeded_db, tmp_path / "database.db")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def client(db_dir):
+    leafora.app.config["TESTING"] = True
+    with leafora.app.test_client() as client:
+        yield client
+
+
+def login(client, user_id, role="user"):
+    """Log a test client in without going through /login."""
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+        session["role"] = role
+        session["user_name"] = "Test"
+        session["user_email"] = f"user{user_id}@example.com"
+        session["user_phone"] = "01700000000"
+        session["user_address"] = "Dhaka"
@@ -0,0 +1,46 @@
+"""Order rollups maintained by triggers must equal a rebuild from orders."""
+from conftest import BUYER_ID
+from utils.analytics import rebuild_rollups
+from utils.db import get_db_connection
+
+
+def rollups(cursor):
+    cursor.execute("SELECT * FROM order_rollups WHERE orders != 0 ORDER BY day, category, order_type, status")
+    return [tuple(row) for row in cursor.fetchall()]
+
+
+def test_category_edit_during_pending_order_keeps_rollups_consistent(db_dir):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE books SET category = 'Novel' WHERE id = 40")
+        cursor.execute("""
+            INSERT INTO orders (book_id, buyer_id, order_type, total_price, status, transaction_code)
+            VALUES (40, ?, 'buy', 700, 'pending', 'LFROLLUP')
+        """, (BUYER_ID,))
+        order_id = cursor.lastrowid
+        cursor.execute("UPDATE books SET category = 'Science' WHERE id = 40")
+        cursor.execute("UPDATE orders SET status = 'accepted' WHERE id = ?", (order_id,))
+        conn.commit()
+
+        incremental = rollups(cursor)
+        rebuild_rollups(conn)
+        assert incremental == rollups(cursor)
+        cursor.execute("SELECT category FROM orders WHERE id = ?", (order_id,))
+        assert cursor.fetchone()["category"] == "Novel"
+    finally:
+        conn.close()
+
+
+def test_book_deletion_keeps_rollups_consistent(db_dir):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM books WHERE id IN (1, 2)")  # their orders cascade
+        conn.commit()
+
+        incremental = rollups(cursor)
+        rebuild_rollups(conn)
+        assert incremental == rollups(cursor)
+    finally:
+        conn.close()
@@ -0,0 +1,44 @@
+"""A copy can only be ordered once, and the owner's decision settles its availability."""
+import app as leafora
+from conftest import ADMIN_ID, BUYER_ID, SELLER_ID, login
+from utils.db import get_db_connection
+
+
+def state(book_id):
+    conn = get_db_connection()
+    try:
+        availability = conn.execute("SELECT availability FROM books WHERE id = ?", (book_id,)).fetchone()[0]
+        orders = conn.execute("SELECT id, status FROM orders WHERE book_id = ? ORDER BY id", (book_id,)).fetchall()
+    finally:
+        conn.close()
+    return availability, [tuple(order) for order in orders]
+
+
+def test_second_order_on_a_reserved_copy_is_refused(client):
+    login(client, BUYER_ID)
+    client.post("/order/31/buy")
+    availability, orders = state(31)
+    assert availability == "reserved" and len(orders) == 1
+
+    with leafora.app.test_client() as other_buyer:
+        login(other_buyer, ADMIN_ID, "super_admin")
+        response = other_buyer.post("/order/31/buy")
+    assert response.status_code == 302
+    assert state(31) == (availability, orders)
+
+
+def test_accept_sells_and_reject_releases(client):
+    login(client, BUYER_ID)
+    client.post("/order/31/buy")
+    client.post("/order/32/rent", data={"rent_months": "2"})
+    (_, [(sold_order, _)]), (_, [(rented_order, _)]) = state(31), state(32)
+
+    login(client, SELLER_ID)
+    client.post(f"/owner/order/{sold_order}/accept")
+    client.post(f"/owner/order/{rented_order}/reject")
+    assert state(31) == ("sold", [(sold_order, "accepted")])
+    assert state(32) == ("available", [(rented_order, "rejected")])
+
+    # An accepted order cannot be rejected afterwards
+    client.post(f"/owner/order/{sold_order}/reject")
+    assert state(31) == ("sold", [(sold_order, "accepted")])
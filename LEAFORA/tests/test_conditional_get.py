@@ -0,0 +1,26 @@
+"""Catalog pages answer 304 until a listing they show changes."""
+import app as leafora
+from conftest import BUYER_ID, login
+from utils.db import get_db_connection
+
+
+def revalidate(client, etag):
+    return client.get("/books", headers={"If-None-Match": etag}).status_code
+
+
+def test_catalog_etag_survives_reviews_but_not_listing_edits(client):
+    etag = client.get("/books").headers["ETag"]
+    assert revalidate(client, etag) == 304
+
+    with leafora.app.test_client() as reviewer:
+        login(reviewer, BUYER_ID)
+        reviewer.post("/book/50/review", data={"rating": "5", "comment": "Great"})
+    assert revalidate(client, etag) == 304
+
+    conn = get_db_connection()
+    try:
+        conn.execute("UPDATE books SET buy_price = buy_price + 1 WHERE id = 50")
+        conn.commit()
+    finally:
+        conn.close()
+    assert revalidate(client, etag) == 200
@@ -0,0 +1,39 @@
+"""Nearest-first catalog search must match a brute-force distance sort."""
+import app as leafora
+import utils.geo as geo
+from utils.db import get_db_connection
+
+
+def search(url):
+    conn = get_db_connection()
+    try:
+        with leafora.app.test_request_context(url):
+            books, _ = leafora.search_books(conn.cursor())
+    finally:
+        conn.close()
+    return books
+
+
+def nearest_distances(place, limit, radius_km=None):
+    """Distances of the `limit` nearest available listings, by scanning them all."""
+    center = geo.geocode(place)
+    conn = get_db_connection()
+    try:
+        rows = conn.execute("SELECT lat, lon FROM books WHERE availability = 'available' AND lat IS NOT NULL")
+        distances = sorted(geo.haversine_km(*center, row["lat"], row["lon"]) for row in rows)
+    finally:
+        conn.close()
+    return [distance for distance in distances if radius_km is None or distance <= radius_km][:limit]
+
+
+def test_any_distance_returns_the_nearest_listings(db_dir, monkeypatch):
+    monkeypatch.setattr(leafora, "NEAR_LIMIT", 120)
+    books = search("/books?near=Sylhet")
+    # More than one place holds, so the search has to widen its ring; compared
+    # by distance since listings at the same place may come back in any order
+    assert [book["distance_km"] for book in books] == nearest_distances("Sylhet", 120)
+
+
+def test_radius_search_stays_within_radius(db_dir):
+    books = search("/books?near=Dhaka&radius_km=25")
+    assert [book["distance_km"] for book in books] == nearest_distances("Dhaka", geo.NEAR_LIMIT, radius_km=25)
@@ -0,0 +1,77 @@
+"""Cover image garbage collection must never remove files it does not own."""
+import hashlib
+import io
+import shutil
+import threading
+
+from werkzeug.datastructures import FileStorage
+
+import utils.images as images
+from utils.db import get_db_connection
+
+
+def test_gc_keeps_template_and_untracked_images(db_dir, tmp_path, monkeypatch):
+    image_root = tmp_path / "Book"
+    shutil.copytree(images.IMAGE_ROOT, image_root, ignore=shutil.ignore_patterns("??"))  # flat legacy files only
+    (image_root / "ab" / "cd").mkdir(parents=True)
+    (image_root / "ab" / "cd" / "abcd.jpg").write_bytes(b"orphan")
+    monkeypatch.setattr(images, "IMAGE_ROOT", str(image_root))
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        # A pinned asset and a collectable orphan, both unreferenced and old
+        cursor.executemany("""
+            INSERT OR REPLACE INTO images (path, size, ref_count, created_at)
+            VALUES (?, 1, 0, '2000-01-01 00:00:00')
+        """, [("1.jpg",), ("ab/cd/abcd.jpg",)])
+        images.register_existing_images(cursor)
+        conn.commit()
+        images.collect_garbage(conn, grace_seconds=0)
+    finally:
+        conn.close()
+
+    for name in images.PINNED_IMAGES + ("LOR.jpg", "TGG.jpg"):
+        assert (image_root / name).exists(), name
+    assert not (image_root / "ab" / "cd" / "abcd.jpg").exists()
+
+
+def test_upload_racing_a_collection_keeps_its_file(db_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(images, "IMAGE_ROOT", str(tmp_path / "Book"))
+    data = b"cover"
+    path = images.shard_path(hashlib.sha256(data).hexdigest(), ".jpg")
+    (tmp_path / "Book" / path).parent.mkdir(parents=True)
+    (tmp_path / "Book" / path).write_bytes(data)
+
+    collector = get_db_connection()
+    collector.execute("""
+        INSERT INTO images (path, size, ref_count, created_at) VALUES (?, 5, 0, '2000-01-01 00:00:00')
+    """, (path,))
+    collector.commit()
+
+    # The same cover is uploaded again while the collector is between
+    # deleting the orphan's row and committing
+    collector.execute("DELETE FROM images WHERE path = ?", (path,))
+
+    def upload():
+        conn = get_db_connection()
+        try:
+            images.save_cover(conn.cursor(), FileStorage(io.BytesIO(data), filename="cover.jpg"))
+            conn.commit()
+        finally:
+            conn.close()
+
+    uploader = threading.Thread(target=upload)
+    uploader.start()
+    uploader.join(0.2)  # blocked on the write lock
+    (tmp_path / "Book" / path).unlink(missing_ok=True)
+    collector.commit()
+    collector.close()
+    uploader.join()
+
+    conn = get_db_connection()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM images WHERE path = ?", (path,)).fetchone()[0] == 1
+    finally:
+        conn.close()
+    assert (tmp_path / "Book" / path).read_bytes() == data
@@ -0,0 +1,32 @@
+"""Notification retention runs as a scheduled background job."""
+import time
+
+import app as leafora
+from utils.db import get_db_connection
+
+
+def test_background_jobs_compact_old_notifications(db_dir, monkeypatch):
+    conn = get_db_connection()
+    try:
+        conn.execute("UPDATE notifications SET status = 'done', created_at = '2000-01-01 00:00:00' WHERE id <= 5")
+        conn.commit()
+    finally:
+        conn.close()
+
+    db_path = str(db_dir / "database.db")
+    monkeypatch.setenv("LEAFORA_NOTIFICATION_COMPACTION_INTERVAL", "1")
+    monkeypatch.setattr(leafora, "get_db_connection", lambda: get_db_connection(db_path))
+    threads = leafora.start_background_jobs()
+    assert [thread.name for thread in threads] == ["notification-compaction"]
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        conn = get_db_connection(db_path)
+        try:
+            remaining = conn.execute("SELECT COUNT(*) FROM notifications WHERE status = 'done'").fetchone()[0]
+        finally:
+            conn.close()
+        if remaining == 0:
+            break
+        time.sleep(0.05)
+    assert remaining == 0
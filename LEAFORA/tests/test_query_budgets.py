@@ -0,0 +1,173 @@
+"""Query-budget regression tests.
+
+Every route in app.py is driven through the Flask test client against the
+seeded database while a connection trace hook counts SQL statements. Each
+route has a checked-in budget in query_budgets.json for:
+
+- queries: SQL statements executed by the route. Each execution counts once,
+  however many trigger steps it runs; transaction control (BEGIN, COMMIT,
+  ...) is not counted
+- vm_steps: SQLite VM instructions executed, in units of VM_STEP_UNIT. Python's
+  sqlite3 does not expose per-statement scan counters, so this stands in for
+  rows scanned: it grows linearly with the rows a query visits, so a lost
+  index or an N+1 loop blows through it.
+
+Run with UPDATE_QUERY_BUDGETS=1 to rewrite the budgets from the current
+measurements (with headroom) after an intentional change.
+"""
+import json
+import os
+
+import pytest
+
+import app as leafora
+from conftest import ADMIN_ID, BUYER_ID, SELLER_ID, login
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), "query_budgets.json")
+VM_STEP_UNIT = 100
+TRANSACTION_CONTROL = {"BEGIN", "COMMIT", "END", "ROLLBACK", "SAVEPOINT", "RELEASE"}
+HEADROOM = 1.25
+
+# (case id, HTTP method, url, logged-in user, role, form data)
+ROUTE_CASES = [
+    ("home", "GET", "/", None, None, None),
+    ("books", "GET", "/books", None, None, None),
+    ("books_fuzzy", "GET", "/books?name=atomc&author=newprt", None, None, None),
+    ("books_near", "GET", "/books?near=Dhaka&radius_km=25", None, None, None),
+    ("books_bbox", "GET", "/books?bbox=90,23,91,24", None, None, None),
+    ("books_ajax", "GET", "/books_ajax?category=Novel", None, None, None),
+    ("suggest", "GET", "/suggest?q=gre&kind=title&kind=author", None, None, None),
+    ("contact", "GET", "/contact", None, None, None),
+    ("book", "GET", "/book/1", None, None, None),
+    ("add_review", "POST", "/book/50/review", BUYER_ID, "user", {"rating": "5", "comment": "Great"}),
+    ("signup_form", "GET", "/signup", None, None, None),
+    ("signup", "POST", "/signup", None, None, {
+        "name": "New", "email": "new@example.com", "phone": "1", "address": "Dhaka",
+        "password": "pw", "confirm_password": "pw"}),
+    ("login_form", "GET", "/login", None, None, None),
+    ("login", "POST", "/login", None, None, {"email": "buyer@example.com", "password": "wrong"}),
+    ("logout", "GET", "/logout", BUYER_ID, "user", None),
+    ("create_order", "POST", "/order/31/buy", BUYER_ID, "user", None),
+    ("accept_order", "POST", "/owner/order/2/accept", SELLER_ID, "user", None),
+    ("reject_order", "POST", "/owner/order/3/reject", SELLER_ID, "user", None),
+    ("bulk_order_action", "POST", "/owner/orders/bulk", SELLER_ID, "user", {
+        "action": "accept", "order_ids": [str(i) for i in range(4, 21)]}),
+    ("receipt", "GET", "/receipt/1", BUYER_ID, "user", None),
+    ("download_receipt", "GET", "/receipt/1/download", SELLER_ID, "user", None),
+    ("profile_seller", "GET", "/profile", SELLER_ID, "user", None),
+    ("profile_buyer", "GET", "/profile", BUYER_ID, "user", None),
+    ("update_profile", "POST", "/update_profile", BUYER_ID, "user", {
+        "full_name": "Buyer", "email": "buyer@example.com", "phone": "1", "address": "Dhaka"}),
+    ("clear_notifications", "POST", "/clear_notifications", BUYER_ID, "user", None),
+    ("save_search", "POST", "/saved_searches", BUYER_ID, "user", {
+        "name": "", "author": "", "category": "Novel", "max_price": "1500"}),
+    ("delete_saved_search", "POST", "/saved_searches/1/delete", BUYER_ID, "user", None),
+    ("add_book", "POST", "/add_book", SELLER_ID, "user", {
+        "title": "New Book", "author": "New Author", "category": "Novel",
+        "sell_price": "300", "location": "Dhaka"}),
+    ("edit_book_form", "GET", "/edit_book/5", SELLER_ID, "user", None),
+    ("edit_book", "POST", "/edit_book/5", SELLER_ID, "user", {
+        "title": "Edited", "author": "Someone", "category": "Novel",
+        "sell_price": "300", "location": "Sylhet"}),
+    ("delete_book", "POST", "/delete_book/201", SELLER_ID, "user", None),
+    ("admin", "GET", "/admin", ADMIN_ID, "super_admin", None),
+    ("admin_analytics", "GET", "/admin/analytics", ADMIN_ID, "super_admin", None),
+    ("admin_profiles", "GET", "/admin/profiles", ADMIN_ID, "super_admin", None),
+    ("admin_profile_download", "GET", "/admin/profiles/missing.folded", ADMIN_ID, "super_admin", None),
+    ("books_profiled", "GET", "/books?_profile=1", ADMIN_ID, "super_admin", None),
+    ("promote_user", "POST", "/admin/promote/2", ADMIN_ID, "super_admin", None),
+    ("demote_user", "POST", "/admin/demote/2", ADMIN_ID, "super_admin", None),
+    ("admin_delete_book", "POST", "/admin/book/delete/250", ADMIN_ID, "super_admin", None),
+    ("admin_delete_user", "POST", "/admin/user/delete/3", ADMIN_ID, "super_admin", None),
+]
+
+measurements = {}
+
+
+class QueryCounter:
+    """Counts statements and VM work on every connection the app opens."""
+
+    def __init__(self):
+        self.statements = []
+        self.vm_ticks = 0
+        self.last = None
+
+    def trace(self, statement):
+        # Depending on the Python/SQLite build, each trigger step is reported
+        # as a "-- TRIGGER ..." line or as the expanded text of the statement
+        # that fired it again. Either way a new execution is a change of text
+        # (parameters are expanded, so a loop over ids still counts each one);
+        # trigger cost shows up in vm_steps
+        if statement.lstrip().startswith("--") or statement == self.last:
+            return
+        self.last = statement
+        if statement.split(None, 1)[0].upper() not in TRANSACTION_CONTROL:
+            self.statements.append(statement)
+
+    def progress(self):
+        self.vm_ticks += 1
+        return 0
+
+    def connect(self, original):
+        def get_db_connection():
+            conn = original()
+            conn.set_trace_callback(self.trace)
+            conn.set_progress_handler(self.progress, VM_STEP_UNIT)
+            return conn
+        return get_db_connection
+
+
+def load_budgets():
+    with open(BUDGETS_PATH) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def write_budgets():
+    yield
+    if os.environ.get("UPDATE_QUERY_BUDGETS") and measurements:
+        budgets = {
+            case_id: {"queries": m["queries"], "vm_steps": int(m["vm_steps"] * HEADROOM) + 2}
+            for case_id, m in sorted(measurements.items())
+        }
+        with open(BUDGETS_PATH, "w", newline="\r\n") as f:
+            json.dump(budgets, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+@pytest.mark.parametrize(
+    "case_id, method, url, user_id, role, data",
+    ROUTE_CASES,
+    ids=[case[0] for case in ROUTE_CASES],
+)
+def test_route_within_query_budget(client, monkeypatch, case_id, method, url, user_id, role, data):
+    if user_id is not None:
+        login(client, user_id, role)
+
+    counter = QueryCounter()
+    monkeypatch.setattr(leafora, "get_db_connection", counter.connect(leafora.get_db_connection))
+
+    response = client.open(url, method=method, data=data)
+    assert response.status_code < 500
+
+    measured = {"queries": len(counter.statements), "vm_steps": counter.vm_ticks}
+    measurements[case_id] = measured
+    if os.environ.get("UPDATE_QUERY_BUDGETS"):
+        return
+
+    budget = load_budgets().get(case_id)
+    assert budget is not None, f"No query budget for {case_id!r}; run with UPDATE_QUERY_BUDGETS=1"
+    assert measured["queries"] <= budget["queries"], (
+        f"{case_id} ran {measured['queries']} queries (budget {budget['queries']}):\n"
+        + "\n".join(counter.statements)
+    )
+    assert measured["vm_steps"] <= budget["vm_steps"], (
+        f"{case_id} used {measured['vm_steps']} x {VM_STEP_UNIT} VM steps (budget {budget['vm_steps']})"
+    )
+
+
+def test_every_route_has_a_budget_case():
+    adapter = leafora.app.url_map.bind("localhost")
+    covered = {adapter.match(url.split("?")[0], method=method)[0] for _, method, url, *_ in ROUTE_CASES}
+    endpoints = {rule.endpoint for rule in leafora.app.url_map.iter_rules() if rule.endpoint != "static"}
+    assert endpoints - covered == set(), "Add a ROUTE_CASES entry for new routes"
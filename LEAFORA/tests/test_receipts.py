@@ -0,0 +1,55 @@
+"""Cached receipts are sharded and only one status is kept per order."""
+import os
+
+import app as leafora
+from conftest import SELLER_ID, login
+from utils.db import get_db_connection
+from utils.receipts import receipt_path, write_receipt, RECEIPT_DIR
+
+
+def render(order):
+    return f"<p>{order['status']}</p>"
+
+
+def test_receipt_replaces_earlier_status(db_dir):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM orders WHERE status = 'pending' LIMIT 1")
+        order_id = cursor.fetchone()["id"]
+        pending = write_receipt(conn, order_id, render)
+        assert pending == receipt_path(order_id, "pending")
+        assert os.path.dirname(pending) == str(order_id // 1000)
+
+        cursor.execute("UPDATE orders SET status = 'accepted' WHERE id = ?", (order_id,))
+        conn.commit()
+        accepted = write_receipt(conn, order_id, render)
+    finally:
+        conn.close()
+
+    assert os.listdir(os.path.join(RECEIPT_DIR, os.path.dirname(accepted))) == [os.path.basename(accepted)]
+
+
+def test_new_order_qr_code_is_rendered_in_the_background(client):
+    login(client, SELLER_ID)
+    conn = get_db_connection()
+    try:
+        book_id = conn.execute(
+            "SELECT id FROM books WHERE availability = 'available' AND owner_id != ? LIMIT 1", (SELLER_ID,)
+        ).fetchone()["id"]
+    finally:
+        conn.close()
+
+    response = client.post(f"/order/{book_id}/buy")
+    assert response.status_code == 200
+    assert b"<svg" not in response.data
+    conn = get_db_connection()
+    try:
+        order_id = conn.execute("SELECT id FROM orders WHERE book_id = ?", (book_id,)).fetchone()["id"]
+    finally:
+        conn.close()
+    assert f"/receipt/{order_id}".encode() in response.data
+
+    leafora.receipt_renderer.jobs.join()
+    assert os.path.exists(os.path.join(RECEIPT_DIR, receipt_path(order_id, "pending")))
+    assert b"<svg" in client.get(f"/receipt/{order_id}").data
@@ -0,0 +1,58 @@
+"""Saved-search alerts must fire for every listing the /books filters would match."""
+from conftest import BUYER_ID, SELLER_ID
+from utils.db import get_db_connection
+from utils.saved_searches import index_saved_search, matching_searches, fuzzy_matches, normalize_category, search_terms
+
+
+def test_misspelt_saved_search_matches_new_listing(db_dir):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM saved_searches")
+        cursor.execute("""
+            INSERT INTO saved_searches (user_id, name, author, category, max_price)
+            VALUES (?, 'Lord of the Rigns', 'tolkein', '', NULL)
+        """, (BUYER_ID,))
+        index_saved_search(cursor, cursor.lastrowid, "Lord of the Rigns", "tolkein", "")
+
+        assert fuzzy_matches("tolkein", "J.R.R. Tolkien")
+        matches = matching_searches(cursor, SELLER_ID, "The Lord of the Rings", "J.R.R. Tolkien", "Fantasy", 500)
+        assert [search["user_id"] for search in matches] == [BUYER_ID]
+        assert matching_searches(cursor, SELLER_ID, "The Hobbit", "J.R.R. Tolkien", "Fantasy", 500) == []
+    finally:
+        conn.close()
+
+
+def brute_force(cursor, owner_id, title, author, category, price):
+    cursor.execute("SELECT * FROM saved_searches WHERE user_id != ? ORDER BY id", (owner_id,))
+    return [
+        search["id"] for search in cursor.fetchall()
+        if (not search["max_price"] or search["max_price"] >= price)
+        and (not search["category"] or normalize_category(search["category"]) == normalize_category(category))
+        and (not search["author"] or fuzzy_matches(search["author"], author))
+        and (not search["name"] or fuzzy_matches(search["name"], title))
+    ]
+
+
+def test_index_finds_exactly_the_matching_searches(db_dir):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        for listing in [
+            ("Atomic Habits", "James Clear", "Novel", 150),
+            ("The Lord of the Rings", "J.R.R. Tolkien", "Fantasy", 1200),
+            ("Deep Work", "Cal Newport", "Focus", 2000),
+            ("Untitled", "Nobody", "Science", 90),
+        ]:
+            found = sorted(search["id"] for search in matching_searches(cursor, SELLER_ID, *listing))
+            assert found == brute_force(cursor, SELLER_ID, *listing), listing
+    finally:
+        conn.close()
+
+
+def test_searches_are_filed_under_their_most_selective_criterion():
+    assert {term_type for term_type, _ in search_terms("", "Tolkien", "Fantasy", 500)} == {"author"}
+    assert {term_type for term_type, _ in search_terms("Rings", "", "Fantasy", 500)} == {"title"}
+    assert search_terms("", "", "Fantasy", 500) == [("category", "fantasy")]
+    assert search_terms("", "", "", 300) == [("price", "500")]
+    assert search_terms("", "", "", None) == [("any", "")]
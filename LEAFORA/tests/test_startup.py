@@ -0,0 +1,33 @@
+"""Cold-start regression test.
+
+Runs `serve.py --benchmark` in a fresh interpreter against the seeded
+database and checks the time to import the app, warm it up and serve the
+first request. Typical timings are about a tenth of these budgets; a
+regression that loads data eagerly at import (or makes warm-up scan whole
+tables) blows through them.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from conftest import PROJECT_ROOT
+
+STARTUP_BUDGET_SECONDS = {
+    "import": 2.0,
+    "total": 4.0,
+    "first_request": 0.5,
+}
+
+
+def test_cold_start_within_budget(db_dir):
+    env = {**os.environ, "LEAFORA_SECRET_KEY": "test", "LEAFORA_DB_PATH": str(db_dir / "database.db")}
+    result = subprocess.run(
+        [sys.executable, os.path.join(PROJECT_ROOT, "serve.py"), "--benchmark"],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+
+    for step, budget in STARTUP_BUDGET_SECONDS.items():
+        assert timings[step] <= budget, f"cold start step {step!r} took {timings[step]}s (budget {budget}s): {timings}"
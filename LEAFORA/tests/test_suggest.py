@@ -0,0 +1,95 @@
+"""Autocomplete only offers available books and refreshes off the request path."""
+import time
+
+import app as leafora
+from conftest import BUYER_ID, SELLER_ID, login
+from utils.db import get_db_connection
+from utils.suggest import SuggestIndex
+
+
+def title(cursor, book_id):
+    cursor.execute("SELECT title FROM books WHERE id = ?", (book_id,))
+    return cursor.fetchone()["title"]
+
+
+def test_rebuild_skips_unavailable_books(db_dir):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        index = SuggestIndex()
+        index.rebuild(cursor, leafora.catalog_version(cursor))
+        reserved, available = title(cursor, 5), title(cursor, 25)
+    finally:
+        conn.close()
+
+    assert reserved not in index.suggest(reserved, ["title"])["title"]
+    assert available in index.suggest(available, ["title"])["title"]
+
+
+def test_stale_index_is_swapped_in_the_background(db_dir):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        index = SuggestIndex()
+        index.rebuild(cursor, leafora.catalog_version(cursor))
+        cursor.execute("UPDATE books SET availability = 'available' WHERE id = 5")
+        conn.commit()
+        freed = title(cursor, 5)
+    finally:
+        conn.close()
+
+    index.refresh_in_background(get_db_connection, leafora.catalog_version)
+    deadline = time.monotonic() + 5
+    while index.refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert freed in index.suggest(freed, ["title"])["title"]
+
+
+NEW_BOOK = {"title": "New Book", "author": "New Author", "category": "Novel", "sell_price": "300", "location": "Dhaka"}
+
+
+def suggested(client, text):
+    return client.get("/suggest", query_string={"q": text, "kind": "title"}).get_json()["title"]
+
+
+def test_order_flow_updates_the_index_in_place(client, monkeypatch):
+    monkeypatch.setattr(leafora, "suggest_index", SuggestIndex())
+    conn = get_db_connection()
+    try:
+        listing = title(conn.cursor(), 25)
+    finally:
+        conn.close()
+    assert listing in suggested(client, listing)
+
+    login(client, BUYER_ID)
+    client.post("/order/25/buy")
+    assert listing not in suggested(client, listing)
+
+    login(client, SELLER_ID)
+    client.post("/add_book", data=NEW_BOOK)
+    conn = get_db_connection()
+    try:
+        order_id = conn.execute("SELECT id FROM orders WHERE book_id = 25").fetchone()["id"]
+    finally:
+        conn.close()
+    client.post(f"/owner/order/{order_id}/reject")
+    assert listing in suggested(client, listing)
+    # Every write went through this process, so nothing forces a rebuild
+    assert not leafora.suggest_index.needs_check()
+
+
+def test_local_write_after_a_foreign_one_forces_a_refresh(client, monkeypatch):
+    monkeypatch.setattr(leafora, "suggest_index", SuggestIndex())
+    conn = get_db_connection()
+    try:
+        listing = title(conn.cursor(), 25)
+        assert listing in suggested(client, listing)
+        # Another worker reserves the copy
+        conn.execute("UPDATE books SET availability = 'reserved' WHERE id = 25")
+        conn.commit()
+    finally:
+        conn.close()
+
+    login(client, SELLER_ID)
+    client.post("/add_book", data=NEW_BOOK)
+    assert leafora.suggest_index.needs_check()
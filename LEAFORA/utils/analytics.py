@@ -0,0 +1,90 @@
+import argparse
+import time
+
+# order_rollups holds one row per (day, category, order_type, status) with the
+# number of orders and their total price. Triggers on orders (see init_db.py)
+# keep it up to date as orders are created, accepted or rejected, so the admin
+# analytics never scan orders or books. The category is the one the book had
+# when the order was placed (orders.category).
+ANALYTICS_DAYS = 30
+TOP_CATEGORIES = 5
+
+
+def rebuild_rollups(conn):
+    """Recompute order_rollups from the orders table (backfill / repair)."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM order_rollups")
+    cursor.execute("""
+        INSERT INTO order_rollups (day, category, order_type, status, orders, revenue)
+        SELECT date(created_at), COALESCE(category, ''), order_type, status,
+               COUNT(*), COALESCE(SUM(total_price), 0)
+        FROM orders
+        GROUP BY date(created_at), COALESCE(category, ''), order_type, status
+    """)
+    conn.commit()
+    cursor.execute("SELECT COUNT(*) FROM order_rollups")
+    return cursor.fetchone()[0]
+
+
+def dashboard_stats(cursor, days=ANALYTICS_DAYS):
+    """Summarise the last `days` days of orders from the rollups only."""
+    window = (f"-{int(days)} days",)
+
+    cursor.execute("""
+        SELECT status, order_type, SUM(orders) AS orders, SUM(revenue) AS revenue
+        FROM order_rollups
+        WHERE day >= date('now', ?)
+        GROUP BY status, order_type
+    """, window)
+    totals = {"orders": 0, "pending": 0, "accepted": 0, "rejected": 0, "revenue": 0, "buy": 0, "rent": 0}
+    for row in cursor.fetchall():
+        totals["orders"] += row["orders"]
+        totals[row["order_type"]] += row["orders"]
+        if row["status"] in totals:
+            totals[row["status"]] += row["orders"]
+        if row["status"] == "accepted":
+            totals["revenue"] += row["revenue"]
+    decided = totals["accepted"] + totals["rejected"]
+    totals["acceptance_rate"] = round(100 * totals["accepted"] / decided, 1) if decided else None
+
+    cursor.execute("""
+        SELECT category, SUM(orders) AS orders, SUM(revenue) AS revenue
+        FROM order_rollups
+        WHERE day >= date('now', ?) AND status = 'accepted'
+        GROUP BY category
+        ORDER BY revenue DESC
+        LIMIT ?
+    """, (*window, TOP_CATEGORIES))
+    top_categories = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT day, SUM(orders) AS orders,
+               SUM(CASE WHEN status = 'accepted' THEN revenue ELSE 0 END) AS revenue
+        FROM order_rollups
+        WHERE day >= date('now', ?)
+        GROUP BY day
+        ORDER BY day DESC
+    """, window)
+    daily = cursor.fetchall()
+
+    return {"days": days, "totals": totals, "top_categories": top_categories, "daily": daily}
+
+
+if __name__ == "__main__":
+    # Usage (from the project root): python utils/analytics.py --backfill
+    from db import get_db_connection
+
+    parser = argparse.ArgumentParser(description="Maintain the order analytics rollups.")
+    parser.add_argument("--backfill", action="store_true", help="rebuild rollups from all orders")
+    args = parser.parse_args()
+
+    if args.backfill:
+        conn = get_db_connection()
+        started = time.perf_counter()
+        try:
+            rows = rebuild_rollups(conn)
+        finally:
+            conn.close()
+        print(f"Rebuilt {rows} rollup rows in {time.perf_counter() - started:.2f}s")
+    else:
+        parser.print_help()
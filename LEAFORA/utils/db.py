@@ -1,7 +1,10 @@
+import os
 import sqlite3
 
-def get_db_connection():
-    conn = sqlite3.connect("database.db")
+DB_PATH = os.environ.get("LEAFORA_DB_PATH", "database.db")
+
+def get_db_connection(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON")
     return conn
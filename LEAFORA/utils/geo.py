@@ -0,0 +1,94 @@
+import csv
+import math
+import os
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), "gazetteer.csv")
+EARTH_RADIUS_KM = 6371.0
+
+# Nearest-first searches read growing rings around the centre (FIRST_RING_KM,
+# then RING_GROWTH times wider) until NEAR_LIMIT listings are found, so a dense
+# area never computes distances beyond its first small box
+NEAR_LIMIT = 200
+FIRST_RING_KM = 5.0
+RING_GROWTH = 4
+MAX_RING_KM = math.pi * EARTH_RADIUS_KM  # half the circumference: the whole globe
+
+_places = None
+
+
+def load_gazetteer():
+    """Load the bundled offline gazetteer into a {name: (lat, lon)} dict (cached)."""
+    global _places
+    if _places is None:
+        places = {}
+        with open(GAZETTEER_PATH, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                places[normalize_place(row["name"])] = (float(row["lat"]), float(row["lon"]))
+        _places = places
+    return _places
+
+
+def normalize_place(name):
+    return " ".join((name or "").lower().replace(".", " ").split())
+
+
+def geocode(location):
+    """Resolve a free-text location to (lat, lon), or None if it is not in the gazetteer.
+
+    Tries the whole string first, then each comma-separated part from the most
+    specific one ("Mirpur, Dhaka" -> Mirpur, then Dhaka).
+    """
+    places = load_gazetteer()
+    key = normalize_place(location)
+    if not key:
+        return None
+    if key in places:
+        return places[key]
+    for part in location.split(","):
+        part = normalize_place(part)
+        if part in places:
+            return places[part]
+    return None
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres."""
+    if None in (lat1, lon1, lat2, lon2):
+        return None
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat, lon, radius_km):
+    """Return (min_lat, max_lat, min_lon, max_lon) enclosing a circle of radius_km."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    dlon = math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat))
+    return (lat - dlat, lat + dlat, max(lon - dlon, -180.0), min(lon + dlon, 180.0))
+
+
+def search_rings(radius_km=None):
+    """Ring radii for a nearest-first search, ending at radius_km (default: the whole globe)."""
+    limit_km = min(radius_km or MAX_RING_KM, MAX_RING_KM)
+    radius = min(FIRST_RING_KM, limit_km)
+    while radius < limit_km:
+        yield radius
+        radius *= RING_GROWTH
+    yield limit_km
+
+
+def parse_bbox(value):
+    """Parse a "min_lon,min_lat,max_lon,max_lat" query string value, or return None."""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in value.split(","))
+    except (AttributeError, ValueError):
+        return None
+    return (min(min_lat, max_lat), max(min_lat, max_lat), min(min_lon, max_lon), max(min_lon, max_lon))
+
+
+def register_geo_functions(conn):
+    """Expose haversine_km() to SQL so candidates from the R*Tree can be sorted by distance."""
+    conn.create_function("haversine_km", 4, haversine_km, deterministic=True)
@@ -0,0 +1,179 @@
+import argparse
+import hashlib
+import logging
+import os
+import threading
+import time
+
+# Covers live under static/images/Book/, sharded by content hash:
+#   ab/cd/abcdef...<sha256>.jpg
+# books.image stores the path relative to IMAGE_ROOT, so templates keep using
+# url_for('static', filename='images/Book/' ~ book.image).
+IMAGE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static", "images", "Book")
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+# Files templates link to directly (templates/index.html); never collected
+# even when no listing refers to them
+PINNED_IMAGES = ("1.jpg", "2.jpg", "3.jpg", "4.jpg")
+
+GC_BATCH_SIZE = 100
+GC_GRACE_SECONDS = 3600  # never collect files younger than this (upload not yet linked to a book)
+
+logger = logging.getLogger(__name__)
+
+
+def image_extension(filename):
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if ext in ALLOWED_EXTENSIONS else None
+
+
+def shard_path(digest, ext):
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def save_cover(cursor, cover_image):
+    """Store an uploaded cover and register it in `images`; return its relative path.
+
+    Identical uploads share one file. The reference count is maintained by
+    triggers on books, so a file saved for a listing that is never created
+    is left with no references and collected later.
+    Raises ValueError for unsupported file types.
+    """
+    ext = image_extension(cover_image.filename)
+    if ext is None:
+        raise ValueError("Unsupported image type.")
+
+    data = cover_image.read()
+    path = shard_path(hashlib.sha256(data).hexdigest(), ext)
+    full_path = os.path.join(IMAGE_ROOT, path)
+
+    # Register first: the upsert takes the database write lock, which the
+    # collector holds while it deletes a row and its file, so the file below
+    # is written either after a collection of the same path or not at all
+    cursor.execute("""
+        INSERT INTO images (path, size) VALUES (?, ?)
+        ON CONFLICT(path) DO UPDATE SET created_at = CURRENT_TIMESTAMP
+    """, (path, len(data)))
+
+    # Write through a temp file so readers never see a partial image
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    tmp_path = f"{full_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, full_path)
+    return path
+
+
+def remove_empty_shards(directory):
+    """Remove now-empty shard directories up to (not including) IMAGE_ROOT."""
+    while os.path.abspath(directory) != IMAGE_ROOT:
+        try:
+            os.rmdir(directory)
+        except OSError:
+            return
+        directory = os.path.dirname(directory)
+
+
+def collect_garbage(conn, batch_size=GC_BATCH_SIZE, grace_seconds=GC_GRACE_SECONDS, max_batches=None):
+    """Delete unreferenced cover files in batches; return (files_removed, bytes_reclaimed)."""
+    cursor = conn.cursor()
+    files_removed = 0
+    bytes_reclaimed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        cursor.execute(f"""
+            SELECT path, size FROM images
+            WHERE ref_count <= 0
+              AND created_at < datetime('now', ?)
+              AND path NOT IN ({",".join("?" * len(PINNED_IMAGES))})
+            LIMIT ?
+        """, (f"-{max(int(grace_seconds), 0)} seconds", *PINNED_IMAGES, batch_size))
+        orphans = cursor.fetchall()
+        if not orphans:
+            break
+
+        for orphan in orphans:
+            # Re-check inside the delete so a file re-referenced or re-uploaded
+            # meanwhile is kept. The file is removed before the commit, while
+            # this transaction holds the write lock that save_cover needs.
+            cursor.execute("""
+                DELETE FROM images
+                WHERE path = ? AND ref_count <= 0 AND created_at < datetime('now', ?)
+            """, (orphan["path"], f"-{max(int(grace_seconds), 0)} seconds"))
+            if cursor.rowcount != 1:
+                continue
+            full_path = os.path.join(IMAGE_ROOT, orphan["path"])
+            try:
+                os.remove(full_path)
+            except FileNotFoundError:
+                continue
+            remove_empty_shards(os.path.dirname(full_path))
+            files_removed += 1
+            bytes_reclaimed += orphan["size"] or 0
+        conn.commit()
+        batches += 1
+        if len(orphans) < batch_size:
+            break
+    return files_removed, bytes_reclaimed
+
+
+def start_gc_thread(connect, interval_seconds):
+    """Run collect_garbage every interval_seconds on a daemon thread."""
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            conn = connect()
+            try:
+                files, reclaimed = collect_garbage(conn)
+                if files:
+                    logger.info("Image GC removed %d files, reclaimed %d bytes", files, reclaimed)
+            except Exception:
+                logger.exception("Image GC failed")
+            finally:
+                conn.close()
+
+    thread = threading.Thread(target=run, name="image-gc", daemon=True)
+    thread.start()
+    return thread
+
+
+def register_existing_images(cursor):
+    """Track legacy cover files (flat layout) that a listing refers to in `images`.
+
+    Files no listing refers to are left untracked, so the collector never
+    touches them: they may be template assets or files of unknown origin.
+    """
+    cursor.execute("""
+        SELECT DISTINCT image FROM books
+        WHERE image IS NOT NULL AND image != ''
+          AND image NOT IN (SELECT path FROM images)
+    """)
+    for row in cursor.fetchall():
+        full_path = os.path.join(IMAGE_ROOT, row["image"])
+        if os.path.isfile(full_path):
+            cursor.execute("INSERT INTO images (path, size) VALUES (?, ?)", (row["image"], os.path.getsize(full_path)))
+    cursor.execute("""
+        UPDATE images
+        SET ref_count = (SELECT COUNT(*) FROM books WHERE books.image = images.path)
+    """)
+    # Earlier versions registered every file on disk; forget the unreferenced
+    # legacy ones again (sharded paths contain a '/' and are still collected)
+    cursor.execute("DELETE FROM images WHERE ref_count <= 0 AND path NOT LIKE '%/%'")
+
+
+if __name__ == "__main__":
+    # Usage (from the project root): python utils/images.py --grace 3600
+    from db import get_db_connection
+
+    parser = argparse.ArgumentParser(description="Remove cover images no listing refers to.")
+    parser.add_argument("--batch-size", type=int, default=GC_BATCH_SIZE)
+    parser.add_argument("--grace", type=int, default=GC_GRACE_SECONDS, help="minimum file age in seconds")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    started = time.perf_counter()
+    try:
+        files, reclaimed = collect_garbage(conn, args.batch_size, args.grace)
+    finally:
+        conn.close()
+    print(f"Removed {files} files, reclaimed {reclaimed / 1024:.1f} KiB in {time.perf_counter() - started:.2f}s")
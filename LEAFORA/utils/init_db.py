@@ -1,8 +1,28 @@
+import os
+import sys
+
+# saved_searches.py imports its siblings as utils.* (as app.py loads it)
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from db import get_db_connection
+from geo import geocode
+from trigram import index_book
+from images import register_existing_images
+from analytics import rebuild_rollups
+from notifications import NOTIFICATION_EVENTS
+from saved_searches import index_saved_search
 
 conn = get_db_connection()
 cursor = conn.cursor()
 
+
+def add_column(table, column, definition):
+    """Add a column to an existing table if it is not there yet (simple migration)."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row["name"] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
 # ==========================================
 # DATABASE STRUCTURE
 # ==========================================
@@ -11,6 +31,14 @@ cursor = conn.cursor()
 # 3. ORDERS - Purchase and rental transactions
 # 4. REVIEWS - Book ratings and comments
 # 5. NOTIFICATIONS - User messaging system
+# 6. BOOKS_GEO - Spatial index for location search
+# 7. BOOK_TRIGRAMS - Fuzzy title/author search index
+# 8. CACHE_VERSIONS - Validators for HTTP conditional GET
+# 9. IMAGES - Cover image store with reference counts
+# 10. ORDER_ROLLUPS - Daily sales/rental analytics
+# 11. SAVED_SEARCHES - Saved /books filters and their inverted index
+# 12. AVAILABILITY - Listing state and partial indexes for the catalog
+# 13. STORAGE - Incremental auto-vacuum for utils/maintenance.py
 # ==========================================
 
 # ==========================================
@@ -101,32 +129,427 @@ CREATE TABLE IF NOT EXISTS reviews (
 # 5. NOTIFICATIONS TABLE
 # Purpose: Manage user-to-user messaging and order status updates
 # ==========================================
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS notifications (
+NOTIFICATIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {name} (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     sender_id INTEGER NOT NULL,
     receiver_id INTEGER NOT NULL,
     book_id INTEGER,
     order_id INTEGER,
-    message TEXT NOT NULL,
+    event_type TEXT NOT NULL CHECK(event_type IN ({event_types})),
     status TEXT DEFAULT 'pending',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY(sender_id) REFERENCES users(id),
     FOREIGN KEY(receiver_id) REFERENCES users(id),
-    FOREIGN KEY(book_id) REFERENCES books(id),
-    FOREIGN KEY(order_id) REFERENCES orders(id)
+    FOREIGN KEY(book_id) REFERENCES books(id) ON DELETE CASCADE,
+    FOREIGN KEY(order_id) REFERENCES orders(id) ON DELETE CASCADE
+)
+"""
+EVENT_TYPES = ",".join(f"'{event_type}'" for event_type in NOTIFICATION_EVENTS)
+cursor.execute(NOTIFICATIONS_SCHEMA.format(name="notifications", event_types=EVENT_TYPES))
+
+# Migrate pre-rendered message rows to typed events (one-off)
+cursor.execute("PRAGMA table_info(notifications)")
+if "message" in [row["name"] for row in cursor.fetchall()]:
+    cursor.execute(NOTIFICATIONS_SCHEMA.format(name="notifications_new", event_types=EVENT_TYPES))
+    cursor.execute("""
+    INSERT INTO notifications_new (id, sender_id, receiver_id, book_id, order_id, event_type, status, created_at)
+    SELECT id, sender_id, receiver_id, book_id, order_id,
+           CASE
+               WHEN message LIKE '%has been accepted%' THEN 'order_accepted'
+               WHEN message LIKE '%has been rejected%' THEN 'order_rejected'
+               ELSE 'order_placed'
+           END,
+           CASE
+               WHEN message LIKE '%has been accepted%' OR message LIKE '%has been rejected%' THEN 'done'
+               ELSE status
+           END,
+           created_at
+    FROM notifications
+    """)
+    cursor.execute("DROP TABLE notifications")
+    cursor.execute("ALTER TABLE notifications_new RENAME TO notifications")
+
+# Rebuild the table when new event types were added to the CHECK constraint
+cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'notifications'")
+if EVENT_TYPES not in cursor.fetchone()["sql"]:
+    cursor.execute(NOTIFICATIONS_SCHEMA.format(name="notifications_new", event_types=EVENT_TYPES))
+    cursor.execute("""
+    INSERT INTO notifications_new (id, sender_id, receiver_id, book_id, order_id, event_type, status, created_at)
+    SELECT id, sender_id, receiver_id, book_id, order_id, event_type, status, created_at
+    FROM notifications
+    """)
+    cursor.execute("DROP TABLE notifications")
+    cursor.execute("ALTER TABLE notifications_new RENAME TO notifications")
+
+# Profile lists a user's notifications newest first; compaction filters on status/age
+cursor.execute("""
+CREATE INDEX IF NOT EXISTS idx_notifications_receiver
+ON notifications(receiver_id, created_at)
+""")
+cursor.execute("""
+CREATE INDEX IF NOT EXISTS idx_notifications_done
+ON notifications(status, created_at)
+""")
+
+# ==========================================
+# 6. BOOKS_GEO (R*TREE) TABLE
+# Purpose: Spatial index over geocoded book locations for radius/bbox search
+# ==========================================
+add_column("books", "lat", "REAL")
+add_column("books", "lon", "REAL")
+
+cursor.execute("""
+CREATE VIRTUAL TABLE IF NOT EXISTS books_geo USING rtree(
+    id,
+    min_lat, max_lat,
+    min_lon, max_lon
 )
 """)
 
-# Update notification status for completed transactions
+# Keep the R*Tree in sync with books.lat/lon on every write
+cursor.execute("""
+CREATE TRIGGER IF NOT EXISTS books_geo_insert AFTER INSERT ON books
+WHEN NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL
+BEGIN
+    INSERT INTO books_geo (id, min_lat, max_lat, min_lon, max_lon)
+    VALUES (NEW.id, NEW.lat, NEW.lat, NEW.lon, NEW.lon);
+END
+""")
 cursor.execute("""
-UPDATE notifications
-SET status = 'done'
-WHERE message LIKE '%has been accepted%'
-OR message LIKE '%has been rejected%'
+CREATE TRIGGER IF NOT EXISTS books_geo_update AFTER UPDATE OF lat, lon ON books
+BEGIN
+    DELETE FROM books_geo WHERE id = OLD.id;
+    INSERT INTO books_geo (id, min_lat, max_lat, min_lon, max_lon)
+    SELECT NEW.id, NEW.lat, NEW.lat, NEW.lon, NEW.lon
+    WHERE NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL;
+END
+""")
+cursor.execute("""
+CREATE TRIGGER IF NOT EXISTS books_geo_delete AFTER DELETE ON books
+BEGIN
+    DELETE FROM books_geo WHERE id = OLD.id;
+END
+""")
+
+# Geocode existing listings against the bundled gazetteer
+cursor.execute("SELECT id, location FROM books WHERE lat IS NULL OR lon IS NULL")
+for row in cursor.fetchall():
+    coords = geocode(row["location"])
+    if coords:
+        cursor.execute("UPDATE books SET lat=?, lon=? WHERE id=?", (coords[0], coords[1], row["id"]))
+
+# ==========================================
+# 7. BOOK_TRIGRAMS TABLE
+# Purpose: Trigram index for typo-tolerant title and author search
+# ==========================================
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS book_trigrams (
+    field TEXT NOT NULL CHECK(field IN ('title','author')),
+    trigram TEXT NOT NULL,
+    book_id INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (field, trigram, book_id),
+    FOREIGN KEY (book_id) REFERENCES books(id) ON DELETE CASCADE
+) WITHOUT ROWID
+""")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_book_trigrams_book ON book_trigrams(book_id)")
+
+# Posting list sizes, so searches can skip the most frequent trigrams
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS book_trigram_df (
+    field TEXT NOT NULL,
+    trigram TEXT NOT NULL,
+    df INTEGER NOT NULL,
+    PRIMARY KEY (field, trigram)
+) WITHOUT ROWID
+""")
+cursor.execute("""
+CREATE TRIGGER IF NOT EXISTS book_trigrams_df_insert AFTER INSERT ON book_trigrams
+BEGIN
+    INSERT INTO book_trigram_df (field, trigram, df) VALUES (NEW.field, NEW.trigram, 1)
+    ON CONFLICT(field, trigram) DO UPDATE SET df = df + 1;
+END
+""")
+cursor.execute("""
+CREATE TRIGGER IF NOT EXISTS book_trigrams_df_delete AFTER DELETE ON book_trigrams
+BEGIN
+    UPDATE book_trigram_df SET df = df - 1 WHERE field = OLD.field AND trigram = OLD.trigram;
+END
+""")
+cursor.execute("SELECT COUNT(*) FROM book_trigram_df")
+if cursor.fetchone()[0] == 0:
+    cursor.execute("""
+    INSERT INTO book_trigram_df (field, trigram, df)
+    SELECT field, trigram, COUNT(*) FROM book_trigrams GROUP BY field, trigram
+    """)
+
+# Index books that have no trigram rows yet
+cursor.execute("""
+SELECT id, title, author FROM books
+WHERE id NOT IN (SELECT DISTINCT book_id FROM book_trigrams)
+""")
+for row in cursor.fetchall():
+    index_book(cursor, row["id"], row["title"], row["author"])
+
+# ==========================================
+# 8. CACHE_VERSIONS TABLE
+# Purpose: Cheap validators (ETag/Last-Modified) for book and catalog pages
+# ==========================================
+add_column("books", "updated_at", "TEXT")
+cursor.execute("UPDATE books SET updated_at = created_at WHERE updated_at IS NULL")
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+)
+""")
+cursor.execute("INSERT OR IGNORE INTO cache_versions (name, version) VALUES ('catalog', 0)")
+
+# Adding or removing a listing invalidates cached catalog pages; the UPDATE
+# trigger is created in section 12, once every column it watches exists
+for event in ("INSERT", "DELETE"):
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS books_catalog_version_{event.lower()} AFTER {event} ON books
+    BEGIN
+        UPDATE cache_versions SET version = version + 1 WHERE name = 'catalog';
+    END
+    """)
+
+# ==========================================
+# 9. IMAGES TABLE
+# Purpose: Track stored cover files and how many books refer to them,
+# so utils/images.py can garbage-collect orphans
+# ==========================================
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+""")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_images_orphans ON images(ref_count, created_at)")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_books_image ON books(image)")
+
+cursor.execute("""
+CREATE TRIGGER IF NOT EXISTS books_image_insert AFTER INSERT ON books
+WHEN NEW.image IS NOT NULL
+BEGIN
+    UPDATE images SET ref_count = ref_count + 1 WHERE path = NEW.image;
+END
+""")
+cursor.execute("""
+CREATE TRIGGER IF NOT EXISTS books_image_update AFTER UPDATE OF image ON books
+WHEN NEW.image IS NOT OLD.image
+BEGIN
+    UPDATE images SET ref_count = ref_count - 1 WHERE path = OLD.image;
+    UPDATE images SET ref_count = ref_count + 1 WHERE path = NEW.image;
+END
+""")
+cursor.execute("""
+CREATE TRIGGER IF NOT EXISTS books_image_delete AFTER DELETE ON books
+WHEN OLD.image IS NOT NULL
+BEGIN
+    UPDATE images SET ref_count = ref_count - 1 WHERE path = OLD.image;
+END
+""")
+
+register_existing_images(cursor)
+
+# ==========================================
+# 10. ORDER_ROLLUPS TABLE
+# Purpose: Daily order counts and totals by category, order type and status,
+# maintained incrementally for the admin analytics view
+# ==========================================
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS order_rollups (
+    day TEXT NOT NULL,
+    category TEXT NOT NULL,
+    order_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    orders INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, category, order_type, status)
+)
+""")
+
+# The category is snapshotted on the order when it is placed, so editing the
+# book later cannot move the order between rollup rows
+cursor.execute("PRAGMA table_info(orders)")
+if "category" not in [row["name"] for row in cursor.fetchall()]:
+    add_column("orders", "category", "TEXT")
+    cursor.execute("""
+    UPDATE orders SET category = COALESCE((SELECT category FROM books WHERE id = orders.book_id), '')
+    """)
+    # Earlier triggers looked the category up on books at every status change
+    cursor.execute("DROP TRIGGER IF EXISTS orders_rollup_insert")
+    cursor.execute("DROP TRIGGER IF EXISTS orders_rollup_status")
+    cursor.execute("DELETE FROM order_rollups")
+
+cursor.execute("""
+CREATE TRIGGER IF NOT EXISTS orders_category_snapshot AFTER INSERT ON orders
+WHEN NEW.category IS NULL
+BEGIN
+    UPDATE orders SET category = COALESCE((SELECT category FROM books WHERE id = NEW.book_id), '')
+    WHERE id = NEW.id;
+END
+""")
+cursor.execute("""
+CREATE TRIGGER IF NOT EXISTS orders_rollup_insert AFTER INSERT ON orders
+BEGIN
+    INSERT INTO order_rollups (day, category, order_type, status, orders, revenue)
+    VALUES (
+        date(NEW.created_at),
+        COALESCE(NEW.category, (SELECT category FROM books WHERE id = NEW.book_id), ''),
+        NEW.order_type, NEW.status, 1, COALESCE(NEW.total_price, 0)
+    )
+    ON CONFLICT(day, category, order_type, status)
+    DO UPDATE SET orders = orders + 1, revenue = revenue + excluded.revenue;
+END
+""")
+cursor.execute("""
+CREATE TRIGGER IF NOT EXISTS orders_rollup_status AFTER UPDATE OF status ON orders
+WHEN NEW.status IS NOT OLD.status
+BEGIN
+    UPDATE order_rollups
+    SET orders = orders - 1, revenue = revenue - COALESCE(OLD.total_price, 0)
+    WHERE day = date(OLD.created_at)
+      AND category = COALESCE(OLD.category, '')
+      AND order_type = OLD.order_type
+      AND status = OLD.status;
+    INSERT INTO order_rollups (day, category, order_type, status, orders, revenue)
+    VALUES (
+        date(NEW.created_at), COALESCE(NEW.category, ''),
+        NEW.order_type, NEW.status, 1, COALESCE(NEW.total_price, 0)
+    )
+    ON CONFLICT(day, category, order_type, status)
+    DO UPDATE SET orders = orders + 1, revenue = revenue + excluded.revenue;
+END
+""")
+# Orders also go away with their book or buyer (ON DELETE CASCADE); the
+# rollups follow, so they always equal rebuild_rollups() over `orders`
+cursor.execute("""
+CREATE TRIGGER IF NOT EXISTS orders_rollup_delete AFTER DELETE ON orders
+BEGIN
+    UPDATE order_rollups
+    SET orders = orders - 1, revenue = revenue - COALESCE(OLD.total_price, 0)
+    WHERE day = date(OLD.created_at)
+      AND category = COALESCE(OLD.category, '')
+      AND order_type = OLD.order_type
+      AND status = OLD.status;
+END
+""")
+
+# Backfill once for databases that already have orders
+cursor.execute("SELECT EXISTS (SELECT 1 FROM order_rollups)")
+if not cursor.fetchone()[0]:
+    rebuild_rollups(conn)
+
+# ==========================================
+# 11. SAVED_SEARCHES TABLES
+# Purpose: Buyers' saved /books filters, indexed by author/title trigrams,
+# category or price band so a new listing is only checked against candidate
+# searches (see utils/saved_searches.py)
+# ==========================================
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS saved_searches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    name TEXT,
+    author TEXT,
+    category TEXT,
+    max_price INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+)
+""")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_saved_searches_user ON saved_searches(user_id)")
+
+# Earlier versions indexed whole words, put the category first and had no
+# price terms: rebuild the term table and re-index every search (one-off)
+cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'saved_search_terms'")
+row = cursor.fetchone()
+reindex_saved_searches = row is not None and "'price'" not in row["sql"]
+if reindex_saved_searches:
+    cursor.execute("DROP TABLE saved_search_terms")
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS saved_search_terms (
+    term_type TEXT NOT NULL CHECK(term_type IN ('category','author','title','price','any')),
+    term TEXT NOT NULL,
+    search_id INTEGER NOT NULL,
+    PRIMARY KEY (term_type, term, search_id),
+    FOREIGN KEY (search_id) REFERENCES saved_searches(id) ON DELETE CASCADE
+) WITHOUT ROWID
+""")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_saved_search_terms_search ON saved_search_terms(search_id)")
+
+if reindex_saved_searches:
+    cursor.execute("SELECT * FROM saved_searches")
+    for row in cursor.fetchall():
+        index_saved_search(cursor, row["id"], row["name"], row["author"], row["category"], row["max_price"])
+
+# ==========================================
+# 12. BOOK AVAILABILITY
+# Purpose: available -> reserved (order placed) -> sold / rented (accepted),
+# or back to available (rejected). Catalog queries only read available books
+# through partial indexes, so sold history costs no scan time.
+# ==========================================
+cursor.execute("PRAGMA table_info(books)")
+if "availability" not in [row["name"] for row in cursor.fetchall()]:
+    add_column(
+        "books", "availability",
+        "TEXT NOT NULL DEFAULT 'available' CHECK(availability IN ('available','reserved','sold','rented'))"
+    )
+    # Derive the state of existing listings from their orders (one-off)
+    cursor.execute("""
+    UPDATE books SET availability = CASE
+        WHEN EXISTS (SELECT 1 FROM orders WHERE book_id = books.id AND status = 'accepted' AND order_type = 'buy') THEN 'sold'
+        WHEN EXISTS (SELECT 1 FROM orders WHERE book_id = books.id AND status = 'accepted' AND order_type = 'rent') THEN 'rented'
+        WHEN EXISTS (SELECT 1 FROM orders WHERE book_id = books.id AND status = 'pending') THEN 'reserved'
+        ELSE 'available'
+    END
+    """)
+
+cursor.execute("""
+CREATE INDEX IF NOT EXISTS idx_books_available_created
+ON books(created_at) WHERE availability = 'available'
+""")
+cursor.execute("""
+CREATE INDEX IF NOT EXISTS idx_books_available_category
+ON books(category, buy_price) WHERE availability = 'available'
+""")
+
+# Edits invalidate cached catalog pages only when they touch a column the
+# catalog renders or filters on (not e.g. the updated_at bump of a review).
+# The first version of this trigger fired on every UPDATE.
+cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'books_catalog_version_update'")
+row = cursor.fetchone()
+if row and "UPDATE OF" not in row["sql"]:
+    cursor.execute("DROP TRIGGER books_catalog_version_update")
+cursor.execute("""
+CREATE TRIGGER IF NOT EXISTS books_catalog_version_update
+AFTER UPDATE OF title, author, category, condition, buy_price, rent_price,
+                location, image, availability, lat, lon ON books
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'catalog';
+END
 """)
 
 conn.commit()
+
+# ==========================================
+# 13. STORAGE SETTINGS
+# Purpose: Let deletes be reclaimed with PRAGMA incremental_vacuum
+# (switching auto_vacuum mode needs one full VACUUM)
+# ==========================================
+cursor.execute("PRAGMA auto_vacuum")
+if cursor.fetchone()[0] != 2:
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    cursor.execute("VACUUM")
+
 conn.close()
 
 print("Database initialized successfully!")
@@ -0,0 +1,173 @@
+import argparse
+import glob
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# ==========================================
+# DATABASE MAINTENANCE
+# ==========================================
+# backup     - online copy through sqlite3.Connection.backup
+# optimize   - PRAGMA optimize + bounded ANALYZE
+# checkpoint - WAL checkpoint so database.db-wal stays small
+# vacuum     - PRAGMA incremental_vacuum to return free pages after deletes
+# Every step reports its duration and the database/WAL sizes before and after.
+# ==========================================
+
+STEPS = ("backup", "optimize", "checkpoint", "vacuum")
+SCHEDULED_STEPS = ("checkpoint", "optimize", "vacuum")
+
+BACKUP_DIR = "backups"
+BACKUP_KEEP = 7
+ANALYSIS_LIMIT = 1000  # rows sampled per index by ANALYZE
+CHECKPOINT_MODE = "TRUNCATE"
+WAL_SIZE_LIMIT = 64 * 1024 * 1024  # bytes kept on disk after a checkpoint
+VACUUM_MIN_FREE_PAGES = 100
+
+logger = logging.getLogger(__name__)
+
+
+def file_sizes(db_path):
+    """Return (database bytes, WAL bytes) for db_path."""
+    def size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+    return size(db_path), size(f"{db_path}-wal")
+
+
+def backup(conn, db_path, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP):
+    """Copy the live database to backup_dir and keep the newest `keep` copies."""
+    os.makedirs(backup_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    dest_path = os.path.join(backup_dir, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.db")
+
+    target = sqlite3.connect(dest_path)
+    try:
+        # One step copies from a single read snapshot; in WAL mode writers keep
+        # going meanwhile, and a stepped copy would restart on every write.
+        conn.backup(target, pages=-1)
+    finally:
+        target.close()
+
+    backups = sorted(glob.glob(os.path.join(backup_dir, f"{name}-*.db")))
+    for old in backups[:-keep] if keep > 0 else []:
+        os.remove(old)
+    return {"file": dest_path, "bytes": os.path.getsize(dest_path)}
+
+
+def optimize(conn, analysis_limit=ANALYSIS_LIMIT):
+    """Refresh planner statistics without a full-table ANALYZE on large tables."""
+    conn.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    conn.commit()
+    return {"analysis_limit": analysis_limit}
+
+
+def checkpoint(conn, mode=CHECKPOINT_MODE, wal_size_limit=WAL_SIZE_LIMIT):
+    """Checkpoint the WAL; TRUNCATE also shrinks the WAL file back to zero."""
+    mode = mode.upper()
+    if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+        raise ValueError(f"Unknown checkpoint mode {mode!r}")
+    conn.execute(f"PRAGMA journal_size_limit = {int(wal_size_limit)}")
+    busy, log_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    return {"mode": mode, "busy": bool(busy), "wal_frames": log_frames, "checkpointed": checkpointed}
+
+
+def vacuum(conn, min_free_pages=VACUUM_MIN_FREE_PAGES):
+    """Release free pages left by deletes (needs auto_vacuum=INCREMENTAL, see init_db.py)."""
+    auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if auto_vacuum != 2:
+        return {"skipped": "auto_vacuum is not INCREMENTAL", "free_pages": free_pages}
+    if free_pages < min_free_pages:
+        return {"skipped": "few free pages", "free_pages": free_pages}
+    # incremental_vacuum frees one page per VM step; executescript (sqlite3_exec)
+    # runs it to completion where execute() would stop after the first page
+    conn.executescript("PRAGMA incremental_vacuum;")
+    return {"free_pages": free_pages, "freed": free_pages - conn.execute("PRAGMA freelist_count").fetchone()[0]}
+
+
+def run_maintenance(conn, db_path, steps=STEPS, backup_dir=BACKUP_DIR):
+    """Run the given steps in order and return one report dict per step."""
+    reports = []
+    for step in steps:
+        db_before, wal_before = file_sizes(db_path)
+        started = time.perf_counter()
+        if step == "backup":
+            detail = backup(conn, db_path, backup_dir)
+        elif step == "optimize":
+            detail = optimize(conn)
+        elif step == "checkpoint":
+            detail = checkpoint(conn)
+        elif step == "vacuum":
+            detail = vacuum(conn)
+        else:
+            raise ValueError(f"Unknown maintenance step {step!r}")
+        db_after, wal_after = file_sizes(db_path)
+        reports.append({
+            "step": step,
+            "seconds": round(time.perf_counter() - started, 3),
+            "db_before": db_before,
+            "db_after": db_after,
+            "wal_before": wal_before,
+            "wal_after": wal_after,
+            **detail,
+        })
+    return reports
+
+
+def format_report(report):
+    extra = ", ".join(
+        f"{key}={value}" for key, value in report.items()
+        if key not in ("step", "seconds", "db_before", "db_after", "wal_before", "wal_after")
+    )
+    return (
+        f"{report['step']:<10} {report['seconds']:>7.3f}s  "
+        f"db {report['db_before']} -> {report['db_after']} B  "
+        f"wal {report['wal_before']} -> {report['wal_after']} B  {extra}"
+    )
+
+
+def start_maintenance_thread(connect, db_path, interval_seconds, steps=SCHEDULED_STEPS, backup_dir=BACKUP_DIR):
+    """Run the maintenance steps every interval_seconds on a daemon thread."""
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            conn = connect()
+            try:
+                for report in run_maintenance(conn, db_path, steps, backup_dir):
+                    logger.info("Maintenance %s", format_report(report))
+            except Exception:
+                logger.exception("Database maintenance failed")
+            finally:
+                conn.close()
+
+    thread = threading.Thread(target=run, name="db-maintenance", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    # Usage (from the project root): python utils/maintenance.py [backup optimize checkpoint vacuum]
+    from db import get_db_connection, DB_PATH
+
+    parser = argparse.ArgumentParser(description="Back up and maintain the SQLite database.")
+    parser.add_argument("steps", nargs="*", help=f"any of {', '.join(STEPS)} (default: all)")
+    parser.add_argument("--backup-dir", default=BACKUP_DIR)
+    args = parser.parse_args()
+    unknown = set(args.steps) - set(STEPS)
+    if unknown:
+        parser.error(f"unknown steps: {', '.join(sorted(unknown))}")
+
+    conn = get_db_connection()
+    try:
+        for report in run_maintenance(conn, DB_PATH, args.steps or STEPS, args.backup_dir):
+            print(format_report(report))
+    finally:
+        conn.close()
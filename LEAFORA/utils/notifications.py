@@ -0,0 +1,91 @@
+import argparse
+import logging
+import threading
+import time
+
+# Notification rows store only the event type and foreign keys; the text is
+# rendered from these templates when the notification is displayed.
+NOTIFICATION_EVENTS = {
+    "order_placed": "{sender_email} placed an order for your book '{book_title}'.",
+    "order_accepted": "Your order for '{book_title}' has been accepted.",
+    "order_rejected": "Your order for '{book_title}' has been rejected.",
+    "saved_search_match": "New listing matching your saved search: '{book_title}'.",
+}
+
+RETENTION_DAYS = 30
+COMPACTION_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+def render_notification(notification):
+    """Render a notification row (joined with sender_email and book_title) to display text."""
+    template = NOTIFICATION_EVENTS.get(notification["event_type"])
+    if template is None:
+        return ""
+    return template.format(
+        sender_email=notification["sender_email"] or "Someone",
+        book_title=notification["book_title"] or "a removed book",
+    )
+
+
+def compact_notifications(conn, retention_days=RETENTION_DAYS, batch_size=COMPACTION_BATCH_SIZE):
+    """Delete `done` notifications older than retention_days in small batches.
+
+    Each batch is its own transaction so writers are never blocked for long.
+    Returns the number of rows deleted.
+    """
+    cursor = conn.cursor()
+    deleted = 0
+    while True:
+        cursor.execute("""
+            DELETE FROM notifications
+            WHERE id IN (
+                SELECT id FROM notifications
+                WHERE status = 'done'
+                  AND created_at < datetime('now', ?)
+                LIMIT ?
+            )
+        """, (f"-{int(retention_days)} days", batch_size))
+        conn.commit()
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            return deleted
+
+
+def start_compaction_thread(connect, interval_seconds, retention_days=RETENTION_DAYS):
+    """Run compact_notifications every interval_seconds on a daemon thread."""
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            conn = connect()
+            try:
+                deleted = compact_notifications(conn, retention_days)
+                if deleted:
+                    logger.info("Notification compaction deleted %d rows", deleted)
+            except Exception:
+                logger.exception("Notification compaction failed")
+            finally:
+                conn.close()
+
+    thread = threading.Thread(target=run, name="notification-compaction", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    # Usage (from the project root): python utils/notifications.py --days 30
+    from db import get_db_connection
+
+    parser = argparse.ArgumentParser(description="Delete old completed notifications.")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS)
+    parser.add_argument("--batch-size", type=int, default=COMPACTION_BATCH_SIZE)
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    started = time.perf_counter()
+    try:
+        deleted = compact_notifications(conn, args.days, args.batch_size)
+    finally:
+        conn.close()
+    print(f"Deleted {deleted} notifications in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,134 @@
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# A capture is two files in PROFILE_DIR (relative to the working directory,
+# like database.db):
+#   <capture_id>.json    - request metadata and the top functions
+#   <capture_id>.folded  - folded stacks ("frame;frame;frame count"), the input
+#                          format of flamegraph.pl, speedscope and inferno
+PROFILE_DIR = "profiles"
+PROFILE_KEEP = 50
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+TOP_FUNCTIONS = 20
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def frame_label(frame):
+    """'function (file:line)' with paths shortened to the project or the package."""
+    code = frame.f_code
+    path = code.co_filename
+    if path.startswith(_PROJECT_ROOT):
+        path = os.path.relpath(path, _PROJECT_ROOT)
+    elif "site-packages" in path:
+        path = path.split("site-packages" + os.sep, 1)[1]
+    else:
+        path = os.path.basename(path)
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ":")
+
+
+class SamplingProfiler:
+    """Samples the call stack of one thread at a fixed interval.
+
+    The sampler runs on its own daemon thread and only reads the target's
+    frames, so the profiled code runs unmodified (unlike cProfile, whose
+    per-call hooks inflate cheap calls such as sqlite3.Row access).
+    """
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit=TOP_FUNCTIONS):
+        """[(label, self samples, inclusive samples)] ordered by inclusive samples."""
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                inclusive[label] += count
+        return [(label, own[label], total) for label, total in inclusive.most_common(limit)]
+
+
+def capture_ids(profile_dir=PROFILE_DIR):
+    """Capture ids, newest first."""
+    paths = glob.glob(os.path.join(profile_dir, "*.json"))
+    return sorted((os.path.splitext(os.path.basename(path))[0] for path in paths), reverse=True)
+
+
+def save_capture(profiler, metadata, profile_dir=PROFILE_DIR, keep=PROFILE_KEEP):
+    """Write a finished profile to disk, drop captures beyond `keep`, return its id."""
+    os.makedirs(profile_dir, exist_ok=True)
+    capture_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}"
+    record = {
+        **metadata,
+        "id": capture_id,
+        "captured_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "duration_ms": round(profiler.duration * 1000, 1),
+        "samples": profiler.samples,
+        "interval_ms": profiler.interval * 1000,
+        "top_functions": profiler.top_functions(),
+    }
+    with open(os.path.join(profile_dir, f"{capture_id}.folded"), "w", encoding="utf-8") as f:
+        f.write(profiler.folded())
+    # The .json is written last: a capture is listed only once it is complete
+    with open(os.path.join(profile_dir, f"{capture_id}.json"), "w", encoding="utf-8") as f:
+        json.dump(record, f)
+
+    for old in capture_ids(profile_dir)[keep:] if keep > 0 else []:
+        for ext in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(profile_dir, old + ext))
+            except OSError:
+                pass
+    return capture_id
+
+
+def load_captures(profile_dir=PROFILE_DIR, limit=PROFILE_KEEP):
+    captures = []
+    for capture_id in capture_ids(profile_dir)[:limit]:
+        try:
+            with open(os.path.join(profile_dir, f"{capture_id}.json"), encoding="utf-8") as f:
+                captures.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # rotated away or still being written
+    return captures
@@ -0,0 +1,127 @@
+import logging
+import os
+import queue
+import threading
+from datetime import datetime
+
+import segno
+
+# Receipts are rendered once per (order, status) into RECEIPT_DIR as a
+# self-contained, print-styled HTML document (the QR code is inlined as SVG),
+# sharded by order id so no directory holds more than a few thousand files:
+#   receipts/<order_id // RECEIPT_SHARD_SIZE>/<order_id>-<status>.html
+# The directory is relative to the working directory, like database.db, and
+# is not under static/ because receipts carry buyer and owner contact details.
+RECEIPT_DIR = "receipts"
+RECEIPT_SHARD_SIZE = 1000
+ORDER_STATUSES = ("pending", "accepted", "rejected")
+QR_SCALE = 3
+
+logger = logging.getLogger(__name__)
+
+
+def receipt_path(order_id, status):
+    """Path of a receipt relative to the receipt directory ('/'-separated)."""
+    order_id = int(order_id)
+    return f"{order_id // RECEIPT_SHARD_SIZE}/{order_id}-{status}.html"
+
+
+def qr_svg(transaction_code):
+    """QR code for a transaction code as an inline <svg> element."""
+    # micro=False: phone scanners do not read Micro QR symbols
+    return segno.make(transaction_code, error="m", micro=False).svg_inline(scale=QR_SCALE)
+
+
+def load_order(cursor, order_id):
+    """Everything a receipt shows, or None if the order no longer exists."""
+    cursor.execute("""
+        SELECT o.id, o.book_id, o.buyer_id, o.order_type, o.rent_months,
+               o.total_price, o.status, o.transaction_code, o.created_at,
+               b.title, b.author, b.category, b.condition, b.image, b.owner_id,
+               u1.full_name AS owner_name, u1.email AS owner_email, u1.phone AS owner_phone,
+               u2.full_name AS buyer_name, u2.email AS buyer_email, u2.phone AS buyer_phone,
+               u2.address AS buyer_address
+        FROM orders o
+        JOIN books b ON o.book_id = b.id
+        JOIN users u1 ON b.owner_id = u1.id
+        JOIN users u2 ON o.buyer_id = u2.id
+        WHERE o.id = ?
+    """, (order_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    order = dict(row)
+    order["created_at"] = datetime.strptime(order["created_at"], "%Y-%m-%d %H:%M:%S")
+    order["qr_svg"] = qr_svg(order["transaction_code"]) if order["transaction_code"] else None
+    return order
+
+
+def write_receipt(conn, order_id, render, receipt_dir=RECEIPT_DIR):
+    """Render the receipt for the order's current status unless it is cached.
+
+    `render(order)` returns the HTML document. Receipts cached for earlier
+    statuses are removed. Returns the path relative to receipt_dir, or None if
+    the order is gone.
+    """
+    order = load_order(conn.cursor(), order_id)
+    if order is None:
+        return None
+
+    relative_path = receipt_path(order_id, order["status"])
+    path = os.path.join(receipt_dir, relative_path)
+    if not os.path.exists(path):
+        html = render(order)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write through a temp file so readers never see a partial receipt
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(html)
+        os.replace(tmp_path, path)
+
+    for status in ORDER_STATUSES:
+        if status != order["status"]:
+            try:
+                os.remove(os.path.join(receipt_dir, receipt_path(order_id, status)))
+            except OSError:
+                pass
+    return relative_path
+
+
+class ReceiptRenderer:
+    """Renders receipts on a background thread after orders are committed.
+
+    schedule() only queues the order id, so requests never wait for QR
+    generation or template rendering. The database and receipt paths are
+    resolved when the job is queued, so a later change of working directory
+    does not move the job.
+    """
+
+    def __init__(self, connect, render, receipt_dir=RECEIPT_DIR):
+        self.connect = connect
+        self.render = render
+        self.receipt_dir = receipt_dir
+        self.jobs = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def schedule(self, order_ids, db_path):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="receipt-renderer", daemon=True)
+                self.thread.start()
+        for order_id in order_ids:
+            self.jobs.put((order_id, os.path.abspath(db_path), os.path.abspath(self.receipt_dir)))
+
+    def run(self):
+        while True:
+            order_id, db_path, receipt_dir = self.jobs.get()
+            try:
+                conn = self.connect(db_path)
+                try:
+                    write_receipt(conn, order_id, self.render, receipt_dir)
+                finally:
+                    conn.close()
+            except Exception:
+                logger.exception("Rendering receipt for order %s failed", order_id)
+            finally:
+                self.jobs.task_done()
@@ -0,0 +1,119 @@
+import math
+
+from utils.trigram import trigrams, MIN_SIMILARITY
+
+# Saved searches are indexed in saved_search_terms under ONE required
+# criterion each, the most selective one set: author trigrams, else title
+# trigrams, else the category, else the price band of max_price, else the
+# catch-all term ('any', ''). A new listing looks up only the terms it could
+# match, and the candidates are then checked against every criterion (the
+# same fuzzy rules as the /books filters).
+#
+# A fuzzy match shares at least ceil(MIN_SIMILARITY * n) of the search's n
+# trigrams with the listing, so it shares at least one of ANY
+# n - ceil(MIN_SIMILARITY * n) + 1 of them: indexing that many is enough to
+# find every match (a search for "tolkein" still finds "Tolkien").
+#
+# A price-only search is filed under the smallest PRICE_BANDS bound at or
+# above its max_price ('' above the last bound); a listing looks up its own
+# band and every band above it.
+PRICE_BANDS = (100, 250, 500, 1000, 2500, 5000)
+
+
+def probe_trigrams(text):
+    """The subset of text's trigrams a fuzzy match must hit at least once."""
+    grams = trigrams(text)
+    keep = len(grams) - math.ceil(MIN_SIMILARITY * len(grams)) + 1
+    # Word-start trigrams ("  t", " to") are shared by many titles; prefer inner ones
+    return sorted(grams, key=lambda gram: (gram.startswith(" "), gram))[:keep]
+
+
+def normalize_category(category):
+    return " ".join((category or "").lower().split())
+
+
+def price_band(price):
+    for bound in PRICE_BANDS:
+        if price <= bound:
+            return str(bound)
+    return ""
+
+
+def search_terms(name, author, category, max_price=None):
+    """Inverted-index terms for a saved search."""
+    if trigrams(author):
+        return [("author", gram) for gram in probe_trigrams(author)]
+    if trigrams(name):
+        return [("title", gram) for gram in probe_trigrams(name)]
+    if normalize_category(category):
+        return [("category", normalize_category(category))]
+    if max_price:
+        return [("price", price_band(max_price))]
+    return [("any", "")]
+
+
+def book_terms(title, author, category, price):
+    """Every term a listing could be matched under."""
+    terms = [("any", ""), ("category", normalize_category(category))]
+    terms += [("author", gram) for gram in sorted(trigrams(author))]
+    terms += [("title", gram) for gram in sorted(trigrams(title))]
+    try:
+        price = int(price)  # the form value as given to add_book
+    except (TypeError, ValueError):
+        return terms
+    terms += [("price", str(bound)) for bound in PRICE_BANDS if bound >= price] + [("price", "")]
+    return terms
+
+
+def index_saved_search(cursor, search_id, name, author, category, max_price=None):
+    cursor.execute("DELETE FROM saved_search_terms WHERE search_id = ?", (search_id,))
+    cursor.executemany("""
+        INSERT OR IGNORE INTO saved_search_terms (term_type, term, search_id)
+        VALUES (?, ?, ?)
+    """, [(term_type, term, search_id) for term_type, term in search_terms(name, author, category, max_price)])
+
+
+def fuzzy_matches(query, text):
+    """Same rule as trigram.fuzzy_match_query: enough of the query's trigrams occur in text."""
+    wanted = trigrams(query)
+    if not wanted:
+        return True
+    return len(wanted & trigrams(text)) / len(wanted) >= MIN_SIMILARITY
+
+
+def matching_searches(cursor, owner_id, title, author, category, price):
+    """Saved searches (other users') that a new listing satisfies."""
+    terms = book_terms(title, author, category, price)
+    values = ",".join("(?, ?)" for _ in terms)
+    # CROSS JOIN keeps the lookup term-driven (primary key probes per term);
+    # otherwise the planner may scan every saved search instead
+    cursor.execute(f"""
+        WITH terms (term_type, term) AS (VALUES {values})
+        SELECT DISTINCT s.*
+        FROM terms x
+        CROSS JOIN saved_search_terms t ON t.term_type = x.term_type AND t.term = x.term
+        CROSS JOIN saved_searches s ON s.id = t.search_id
+        WHERE (s.max_price IS NULL OR s.max_price = 0 OR s.max_price >= CAST(? AS INTEGER))
+          AND s.user_id != ?
+    """, [value for term in terms for value in term] + [price, owner_id])
+
+    matches = []
+    for search in cursor.fetchall():
+        if search["category"] and normalize_category(search["category"]) != normalize_category(category):
+            continue
+        if search["author"] and not fuzzy_matches(search["author"], author):
+            continue
+        if search["name"] and not fuzzy_matches(search["name"], title):
+            continue
+        matches.append(search)
+    return matches
+
+
+def notify_matches(cursor, book_id, owner_id, searches):
+    """Send one alert per user (even if several of their searches matched), in one batch."""
+    receivers = sorted({search["user_id"] for search in searches})
+    cursor.executemany("""
+        INSERT INTO notifications (sender_id, receiver_id, book_id, event_type, status)
+        VALUES (?, ?, ?, 'saved_search_match', 'done')
+    """, [(owner_id, receiver_id, book_id) for receiver_id in receivers])
+    return len(receivers)
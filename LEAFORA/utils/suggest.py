@@ -0,0 +1,168 @@
+import bisect
+import logging
+import threading
+import time
+
+SUGGEST_KINDS = ("title", "author", "category")
+SUGGEST_LIMIT = 8
+MAX_SCAN = 200  # prefix matches examined per kind before ranking
+STALE_CHECK_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text):
+    return " ".join((text or "").lower().split())
+
+
+def prefix_keys(kind, text):
+    """Keys under which a value is findable: the whole value, and for titles and
+    authors every word start too ("The Great Gatsby" -> "great gatsby", "gatsby")."""
+    words = normalize(text).split()
+    if not words:
+        return []
+    if kind == "category":
+        return [" ".join(words)]
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class SuggestIndex:
+    """In-memory sorted prefix index over available books' titles, authors and categories.
+
+    Each kind keeps a sorted list of (key, display) pairs, so a prefix lookup is
+    a bisect plus a short scan. Values are reference counted because many books
+    share an author or category. Local writes update the index incrementally;
+    writes made by other processes are noticed through the catalog version
+    (see cache_versions) and trigger a rebuild on a background thread; lookups
+    keep using the previous index until the new one is swapped in.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {kind: [] for kind in SUGGEST_KINDS}
+        self.counts = {}
+        self.version = None
+        self.checked_at = 0.0
+        self.refreshing = False
+
+    def rebuild(self, cursor, version):
+        entries = {kind: [] for kind in SUGGEST_KINDS}
+        counts = {}
+        cursor.execute("SELECT title, author, category FROM books WHERE availability = 'available'")
+        for row in cursor:
+            for kind in SUGGEST_KINDS:
+                display = (row[kind] or "").strip()
+                if not display:
+                    continue
+                counts[(kind, display)] = counts.get((kind, display), 0) + 1
+        for (kind, display) in counts:
+            entries[kind].extend((key, display) for key in prefix_keys(kind, display))
+        for kind in SUGGEST_KINDS:
+            entries[kind].sort()
+        with self.lock:
+            self.entries, self.counts, self.version = entries, counts, version
+            self.checked_at = time.monotonic()
+
+    def needs_check(self):
+        """True when the index was never built or the catalog version is due a re-check.
+
+        The version is only compared every STALE_CHECK_SECONDS, so most lookups
+        do no database work at all.
+        """
+        return self.version is None or time.monotonic() - self.checked_at > STALE_CHECK_SECONDS
+
+    def refresh(self, cursor, version):
+        """Rebuild if the catalog changed (e.g. in another worker process) since the last check."""
+        if version != self.version:
+            self.rebuild(cursor, version)
+        else:
+            self.checked_at = time.monotonic()
+
+    def refresh_in_background(self, connect, current_version):
+        """Run refresh() on a daemon thread unless one is already running.
+
+        `connect()` opens a database connection and `current_version(cursor)`
+        reads the catalog version.
+        """
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+
+        def run():
+            try:
+                conn = connect()
+                try:
+                    self.refresh(conn.cursor(), current_version(conn.cursor()))
+                finally:
+                    conn.close()
+            except Exception:
+                logger.exception("Refreshing the suggest index failed")
+            finally:
+                with self.lock:
+                    self.refreshing = False
+
+        threading.Thread(target=run, name="suggest-refresh", daemon=True).start()
+
+    def add_book(self, title, author, category):
+        self._update({"title": title, "author": author, "category": category}, +1)
+
+    def remove_book(self, title, author, category):
+        self._update({"title": title, "author": author, "category": category}, -1)
+
+    def mark_version(self, version, bumps=1):
+        """Record the catalog version after a local write already applied here.
+
+        `bumps` is how many times that write moved the version (one per books
+        row it changed). If the version moved further, something this index
+        never saw was written too, so the next lookup refreshes instead.
+        """
+        with self.lock:
+            if self.version is None:
+                return
+            if version == self.version + bumps:
+                self.version = version
+            else:
+                self.checked_at = 0.0
+
+    def _update(self, values, delta):
+        with self.lock:
+            if self.version is None:
+                return  # not built yet; the first lookup loads everything
+            for kind, display in values.items():
+                display = (display or "").strip()
+                if not display:
+                    continue
+                count = self.counts.get((kind, display), 0) + delta
+                keys = prefix_keys(kind, display)
+                entries = self.entries[kind]
+                if delta > 0 and count == 1:
+                    for key in keys:
+                        bisect.insort(entries, (key, display))
+                elif count <= 0:
+                    for key in keys:
+                        i = bisect.bisect_left(entries, (key, display))
+                        if i < len(entries) and entries[i] == (key, display):
+                            del entries[i]
+                if count > 0:
+                    self.counts[(kind, display)] = count
+                else:
+                    self.counts.pop((kind, display), None)
+
+    def suggest(self, prefix, kinds=SUGGEST_KINDS, limit=SUGGEST_LIMIT):
+        """Return {kind: [display, ...]} for values starting with prefix, most common first."""
+        prefix = normalize(prefix)
+        results = {}
+        with self.lock:
+            for kind in kinds:
+                entries = self.entries[kind]
+                matches = {}
+                i = bisect.bisect_left(entries, (prefix, ""))
+                end = min(i + MAX_SCAN, len(entries))
+                while i < end and entries[i][0].startswith(prefix):
+                    display = entries[i][1]
+                    matches[display] = self.counts.get((kind, display), 0)
+                    i += 1
+                ranked = sorted(matches, key=lambda display: (-matches[display], display))
+                results[kind] = ranked[:limit]
+        return results
@@ -0,0 +1,77 @@
+import math
+import re
+
+# Fields of `books` covered by the trigram index
+TRIGRAM_FIELDS = ("title", "author")
+
+# Minimum share of the query's trigrams a field must contain to count as a match
+MIN_SIMILARITY = 0.5
+# Most fuzzy matches returned by a catalog search (after all other filters)
+MAX_MATCHES = 500
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def trigrams(text):
+    """Return the set of trigrams for text, pg_trgm style (words padded with spaces)."""
+    grams = set()
+    for word in _WORD_RE.findall((text or "").lower()):
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def index_book(cursor, book_id, title, author):
+    """(Re)build the trigram rows for one book. Call after every insert/update of title or author."""
+    cursor.execute("DELETE FROM book_trigrams WHERE book_id = ?", (book_id,))
+    for field, text in zip(TRIGRAM_FIELDS, (title, author)):
+        grams = trigrams(text)
+        cursor.executemany("""
+            INSERT INTO book_trigrams (field, trigram, book_id, size)
+            VALUES (?, ?, ?, ?)
+        """, [(field, gram, book_id, len(grams)) for gram in grams])
+
+
+def fuzzy_match_query(cursor, field, text, min_similarity=MIN_SIMILARITY):
+    """Return (sql, params) for a subquery of (book_id, score) rows whose `field`
+    fuzzily matches text, to be joined into a larger query.
+
+    The score is the fraction of the query's trigrams found in the field, so a
+    short or misspelt query still matches a longer title, plus a small Jaccard
+    term that breaks ties in favour of fields close to the query's length.
+
+    A match contains at least ceil(min_similarity * n) of the n query
+    trigrams, so it must contain one of the n - ceil(min_similarity * n) + 1
+    rarest ones. Candidates are read from those posting lists only (sizes from
+    book_trigram_df), and the frequent trigrams, whose posting lists cover
+    much of the catalog, are only probed per candidate through the primary key.
+    """
+    if field not in TRIGRAM_FIELDS:
+        raise ValueError(f"No trigram index for field {field!r}")
+    grams = sorted(trigrams(text))
+    if not grams:
+        return "SELECT NULL AS book_id, 0 AS score WHERE 0", []
+
+    placeholders = ",".join("?" * len(grams))
+    cursor.execute(f"""
+        SELECT trigram, df FROM book_trigram_df
+        WHERE field = ? AND trigram IN ({placeholders})
+    """, [field, *grams])
+    df = {row["trigram"]: row["df"] for row in cursor.fetchall()}
+    required = math.ceil(min_similarity * len(grams))
+    probe = sorted(grams, key=lambda gram: (df.get(gram, 0), gram))[:len(grams) - required + 1]
+
+    sql = f"""
+        SELECT c.book_id,
+               COUNT(*) * 1.0 / ? + COUNT(*) * 1.0 / (? + MAX(t.size) - COUNT(*)) / 100 AS score
+        FROM (
+            SELECT DISTINCT book_id FROM book_trigrams
+            WHERE field = ? AND trigram IN ({",".join("?" * len(probe))})
+        ) c
+        CROSS JOIN book_trigrams t
+            ON t.field = ? AND t.trigram IN ({placeholders}) AND t.book_id = c.book_id
+        GROUP BY c.book_id
+        HAVING COUNT(*) >= ?
+    """
+    return sql, [len(grams), len(grams), field, *probe, field, *grams, required]